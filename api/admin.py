@@ -1,3 +1,15 @@
 from django.contrib import admin
 
+from .models import WatchNotification
+
+
 # Register your models here.
+class WatchNotificationAdmin(admin.ModelAdmin):
+    """Watch Notification Admin Page Manager"""
+
+    list_display = ["user", "parking_space", "status", "attempts", "created_at"]
+    list_filter = ["status"]
+    autocomplete_fields = ["user", "parking_space"]
+
+
+admin.site.register(WatchNotification, WatchNotificationAdmin)
@@ -0,0 +1,39 @@
+"""send queued watch notification emails manage.py script
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.notifications import BATCH_SIZE, send_pending_notifications
+
+
+class Command(BaseCommand):
+    """send the pending watch notifications, once or in a loop"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="Number of emails sent over one connection",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling for new notifications",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5,
+            help="Seconds between two polls with --loop",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_pending_notifications(options["batch_size"])
+            if sent or failed or not options["loop"]:
+                self.stdout.write(f"{sent} notifications sent, {failed} failed")
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
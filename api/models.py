@@ -1,3 +1,33 @@
 from django.db import models
+from django.utils import timezone
+
 
 # Create your models here.
+class WatchNotification(models.Model):
+    """outbox of emails telling a user that a spot they watch got
+    below their threshold, sent by api.notifications outside of the
+    occupancy update request
+    """
+
+    status_list = [
+        ("pending", "Pending"),
+        ("sent", "Sent"),
+        ("failed", "Failed"),
+    ]
+    user = models.ForeignKey("users.user", on_delete=models.CASCADE)
+    parking_space = models.ForeignKey("map.ParkingSpace", on_delete=models.CASCADE)
+    occupancy_percent = models.IntegerField()
+    # * domain / protocol of the request that triggered the notification,
+    # * used to build the link in the email
+    domain = models.CharField(max_length=200)
+    protocol = models.CharField(max_length=10, default="https")
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(blank=True, null=True)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    status = models.CharField(max_length=20, choices=status_list, default="pending")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "id"], name="watchnotification_status_idx"),
+        ]
@@ -0,0 +1,262 @@
+"""watch notification emails
+
+Occupancy updates only queue WatchNotification rows. They are sent here,
+in batches rendered up front and sent over a single email connection,
+either by a background thread handed the notifications of each update
+once it commits (WATCH_NOTIFICATION_DISPATCH = "thread") or by the
+send_watch_notifications management command.
+
+The background thread retries failures with an exponential backoff until
+they are sent or reach MAX_ATTEMPTS. Retries only live in memory: the
+notifications of a process that exits in between stay pending until the
+command is run.
+"""
+import logging
+import operator
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.template import loader
+from django.utils import timezone
+from django.db import connections, transaction
+from django.db.models import Q
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMultiAlternatives, get_connection
+
+from users.models import UserWatchedParkingSpace
+from .models import WatchNotification
+
+logger = logging.getLogger(__name__)
+
+EXTRA_EMAIL_CONTEXT = {"site_name": "Parkrowd"}
+EMAIL_TEMPLATE_NAME = "api/parkingspace_status_update_email_template.html"
+SUBJECT_TEMPLATE_NAME = "api/parkingspace_status_update_email_subject_template.txt"
+BATCH_SIZE = 100
+# * a notification failing this many times is marked as failed for good
+MAX_ATTEMPTS = 5
+# * seconds before the first background retry, doubled after each one
+RETRY_DELAY = 2
+
+# * a single worker, so batches of one process never race each other
+_executor = ThreadPoolExecutor(max_workers=1)
+
+
+def build_message(
+    notification: WatchNotification, connection=None
+) -> EmailMultiAlternatives:
+    """render the email of a notification
+
+    Args:
+        notification (WatchNotification): notification with its user loaded
+        connection: email connection the message will be sent through
+
+    Returns:
+        EmailMultiAlternatives: message ready to be sent
+    """
+    user = notification.user
+    user_email = getattr(user, get_user_model().get_email_field_name())
+    context = {
+        "user": user,
+        "email": user_email,
+        "domain": notification.domain,
+        "protocol": notification.protocol,
+        **EXTRA_EMAIL_CONTEXT,
+    }
+    subject = loader.render_to_string(SUBJECT_TEMPLATE_NAME, context)
+    # Email subject *must not* contain newlines
+    subject = "".join(subject.splitlines())
+    body = loader.render_to_string(EMAIL_TEMPLATE_NAME, context)
+    return EmailMultiAlternatives(
+        subject, body, None, [user_email], connection=connection
+    )
+
+
+def send_notifications(
+    notifications: List[WatchNotification], connection=None
+) -> Tuple[int, int]:
+    """render every message, then send them all through one connection
+
+    Each message goes through its own send_messages call on the shared
+    connection, so a refused recipient only fails its own notification.
+    The status, attempts and last_error of the notifications are updated
+    in memory, saving them is up to the caller.
+
+    Args:
+        notifications (List[WatchNotification]): notifications, users loaded
+        connection: email connection to reuse, a new one by default
+
+    Returns:
+        Tuple[int, int]: number of notifications sent and failed
+    """
+    sent = failed = 0
+    messages = []
+    for notification in notifications:
+        notification.attempts += 1
+        try:
+            messages.append((notification, build_message(notification)))
+        except Exception as e:
+            _record_failure(notification, e)
+            failed += 1
+
+    if not messages:
+        return sent, failed
+
+    with connection or get_connection() as connection:
+        for notification, message in messages:
+            try:
+                connection.send_messages([message])
+            except Exception as e:
+                _record_failure(notification, e)
+                failed += 1
+                continue
+            notification.status = "sent"
+            notification.sent_at = timezone.now()
+            sent += 1
+    return sent, failed
+
+
+def _record_failure(notification: WatchNotification, error: Exception) -> None:
+    logger.warning("Failed to send watch notification %s: %s", notification.id, error)
+    notification.last_error = str(error)
+    if notification.attempts >= MAX_ATTEMPTS:
+        notification.status = "failed"
+
+
+def send_pending_notifications(
+    batch_size: int = BATCH_SIZE, ids: Optional[List[int]] = None
+) -> Tuple[int, int]:
+    """send pending notifications, one connection per batch
+
+    Each notification is visited at most once per call, so the ones that
+    fail are retried on the next call, up to MAX_ATTEMPTS times.
+
+    Args:
+        batch_size (int): number of notifications locked and sent at once
+        ids (Optional[List[int]]): only send these notifications
+
+    Returns:
+        Tuple[int, int]: number of notifications sent and failed
+    """
+    pending = WatchNotification.objects.filter(status="pending")
+    if ids is not None:
+        pending = pending.filter(id__in=ids)
+
+    sent = failed = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                pending.select_for_update(skip_locked=True)
+                .select_related("user")
+                .filter(id__gt=last_id)
+                .order_by("id")[:batch_size]
+            )
+            if not batch:
+                return sent, failed
+            last_id = batch[-1].id
+
+            batch_sent, batch_failed = send_notifications(batch)
+            sent += batch_sent
+            failed += batch_failed
+            WatchNotification.objects.bulk_update(
+                batch, ["status", "sent_at", "attempts", "last_error"]
+            )
+
+
+def queue_watch_notifications(
+    occupancies: Dict[str, int], domain: str, protocol: str
+) -> List[WatchNotification]:
+    """turn the watches triggered by occupancy changes into notifications
+
+    Runs a fixed number of queries whatever the number of spots and
+    watchers: one to fetch the triggered watches, one bulk insert and one
+    delete.
+
+    Args:
+        occupancies (Dict[str, int]): new occupancy of each updated spot
+        domain (str): domain used in the email links
+        protocol (str): protocol used in the email links
+
+    Returns:
+        List[WatchNotification]: the queued notifications
+    """
+    if not occupancies:
+        return []
+    triggers = reduce(
+        operator.or_,
+        (
+            Q(parking_space_id=parking_space_id, threshold__gte=occupancy_percent)
+            for parking_space_id, occupancy_percent in occupancies.items()
+        ),
+    )
+    with transaction.atomic():
+        # * locked so a watch is never turned into two notifications
+        triggered = list(
+            UserWatchedParkingSpace.objects.select_for_update()
+            .filter(triggers)
+            .values_list("id", "user_id", "parking_space_id")
+        )
+        if not triggered:
+            return []
+        queued = WatchNotification.objects.bulk_create(
+            [
+                WatchNotification(
+                    user_id=user_id,
+                    parking_space_id=parking_space_id,
+                    occupancy_percent=occupancies[parking_space_id],
+                    domain=domain,
+                    protocol=protocol,
+                )
+                for _, user_id, parking_space_id in triggered
+            ]
+        )
+        UserWatchedParkingSpace.objects.filter(
+            id__in=[watch_id for watch_id, _, _ in triggered]
+        ).delete()
+    return queued
+
+
+def _send_in_background(ids: Optional[List[int]], attempt: int = 1) -> None:
+    try:
+        _, failed = send_pending_notifications(ids=ids)
+    except Exception:
+        logger.exception("Failed to send watch notifications")
+        failed = 1
+    finally:
+        connections.close_all()
+    if failed and attempt < MAX_ATTEMPTS:
+        _schedule_retry(ids, attempt)
+
+
+def _schedule_retry(ids: Optional[List[int]], attempt: int) -> None:
+    """send the still pending notifications again after a backoff, the
+    executor is left free in the meantime"""
+    timer = threading.Timer(
+        RETRY_DELAY * 2 ** (attempt - 1),
+        _executor.submit,
+        args=(_send_in_background, ids, attempt + 1),
+    )
+    # * a pending retry must not keep the process alive
+    timer.daemon = True
+    timer.start()
+
+
+def dispatch(notifications: List[WatchNotification]) -> None:
+    """hand the notifications of one occupancy change to the background
+    sender once the current transaction commits, they are then rendered
+    and sent as a single batch
+
+    Does nothing when WATCH_NOTIFICATION_DISPATCH is "worker", the
+    send_watch_notifications command is then expected to run periodically.
+    """
+    if settings.WATCH_NOTIFICATION_DISPATCH == "thread":
+        if not notifications:
+            return
+        ids = [notification.id for notification in notifications]
+        if None in ids:
+            # * the database did not return the ids of the bulk insert
+            ids = None
+        transaction.on_commit(lambda: _executor.submit(_send_in_background, ids))
@@ -0,0 +1,56 @@
+"""benchmark of the watch notification send path
+
+Compares opening one email connection per recipient, as occupancy updates
+used to do, with rendering every message of an update first and sending
+them over a single connection. Runs against the file-based backend in a
+temporary directory and touches no database row.
+
+    python manage.py runscript bench_watch_notifications --script-args 10 100 1000
+"""
+import tempfile
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.mail import get_connection
+
+from ..models import WatchNotification
+from ..notifications import build_message, send_notifications
+
+DEFAULT_WATCHER_COUNTS = [10, 100, 1000]
+BACKEND = "django.core.mail.backends.filebased.EmailBackend"
+
+
+def make_notifications(count: int):
+    User = get_user_model()
+    return [
+        WatchNotification(
+            user=User(username=f"watcher{i}", email=f"watcher{i}@example.com"),
+            occupancy_percent=50,
+            domain="localhost:8000",
+        )
+        for i in range(count)
+    ]
+
+
+def per_recipient(notifications, email_dir: str) -> None:
+    for notification in notifications:
+        connection = get_connection(BACKEND, file_path=email_dir)
+        build_message(notification, connection=connection).send()
+
+
+def batched(notifications, email_dir: str) -> None:
+    send_notifications(notifications, get_connection(BACKEND, file_path=email_dir))
+
+
+def run(*args):
+    counts = [int(arg) for arg in args] or DEFAULT_WATCHER_COUNTS
+    print(f"{'watchers':>8} {'per recipient (ms)':>20} {'batched (ms)':>14}")
+    for count in counts:
+        timings = []
+        for send in (per_recipient, batched):
+            notifications = make_notifications(count)
+            with tempfile.TemporaryDirectory() as email_dir:
+                start = time.perf_counter()
+                send(notifications, email_dir)
+                timings.append((time.perf_counter() - start) * 1000)
+        print(f"{count:>8} {timings[0]:>20.1f} {timings[1]:>14.1f}")
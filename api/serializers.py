@@ -65,6 +65,54 @@ class ParkingSpaceSerializer(serializers.ModelSerializer):
         ]
 
 
+class ParkingSpaceCompactSerializer(serializers.ModelSerializer):
+    """ParkingSpaceSerializer with only the latest occupancy update
+
+    expects spots prefetched with the latest history row in `latest_updates`
+    and, when `summary` is set in the context, annotated with
+    `history_count` and `mean_occupancy_percent`
+    """
+
+    user = UserSerializer()
+    latest_update = serializers.SerializerMethodField()
+    occupancy_summary = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ParkingSpace
+        fields = [
+            "parking_spot_id",
+            "parking_spot_name",
+            "longitude",
+            "latitude",
+            "operation_hours",
+            "type",
+            "detail",
+            "occupancy_percent",
+            "user",
+            "latest_update",
+            "occupancy_summary",
+            "vehicle_spaces_capacity",
+            "available_vehicle_spaces",
+        ]
+
+    def get_latest_update(self, spot):
+        if not spot.latest_updates:
+            return None
+        return OccupancyHistorySerializer(spot.latest_updates[0]).data
+
+    def get_occupancy_summary(self, spot):
+        return {
+            "history_count": spot.history_count,
+            "mean_occupancy_percent": spot.mean_occupancy_percent,
+        }
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.context.get("summary"):
+            fields.pop("occupancy_summary")
+        return fields
+
+
 class CommentSerializer(serializers.ModelSerializer):
     author = UserSerializer()
 
@@ -1,21 +1,61 @@
 import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from smtplib import SMTPException
+from unittest.mock import patch
 
 from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends import locmem
+from django.core.management import call_command
 from django.urls import reverse
 from django.utils import timezone
+from django.db import connection, connections
+from django.test import (
+    TransactionTestCase,
+    override_settings,
+    skipUnlessDBFeature,
+)
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
-from rest_framework.test import APITestCase
+from haversine import haversine, Unit
+from rest_framework.test import APIClient, APITestCase
 
-from map.models import ParkingSpace
+from map import clustering
+from map.spatial import spot_index
+from map.models import ParkingSpace, OccupancyHistory
 from map.scripts import load_parking_lot_data
-from users.models import Post, Comment, UserWatchedParkingSpace
+from users.models import Post, Comment, UserVerification, UserWatchedParkingSpace
+from .models import WatchNotification
+from .notifications import (
+    MAX_ATTEMPTS,
+    _send_in_background,
+    send_notifications,
+    send_pending_notifications,
+)
 
 
 User = get_user_model()
 
+
+class FailingEmailBackend(locmem.EmailBackend):
+    """locmem backend refusing every message sent to 1parkrowd@gmail.com"""
+
+    def send_messages(self, messages):
+        for message in messages:
+            if f"1{EMAIL}" in message.to:
+                raise SMTPException("mailbox unavailable")
+        return super().send_messages(messages)
+
+
 TEST_LAT = 40.69446042799896
 TEST_LON = -73.9864403526369
 PARKINGSPACE_GET_API_PATH = "api:spots-near-center"
+PARKINGSPACE_BBOX_GET_API_PATH = "api:spots-in-bbox"
+PARKINGSPACE_CLUSTERS_GET_API_PATH = "api:spot-clusters"
+PARKINGSPACE_FORECAST_GET_API_PATH = "api:spot-forecast"
+BBOX = f"sw_lat={TEST_LAT - 0.01}&sw_lon={TEST_LON - 0.01}&ne_lat={TEST_LAT + 0.01}&ne_lon={TEST_LON + 0.01}"
 
 USERNAME = "parkrowd"
 EMAIL = "parkrowd@gmail.com"
@@ -29,6 +69,7 @@ LONGITUDE = "-73.9853043125"
 LATITUDE = "40.7486538125"
 PARKING_SPOT_NAME = "Empire State Building"
 PARKINGSPACE_CHANGE_OCCUPANCY_POST_PATH = "api:change-occupancy"
+PARKINGSPACE_BULK_CHANGE_OCCUPANCY_POST_PATH = "api:bulk-change-occupancy"
 
 PARKINGSPACE_POSTS_GET_PATH = "api:get-spot-posts"
 TITLE = "Parking Here For 15 Minutes"
@@ -46,6 +87,7 @@ class ParkingSpaceNearCenterAPITest(APITestCase):
     """test getting parkingspaces near center GET"""
 
     def setUp(self):
+        cache.clear()
         load_parking_lot_data.run()
 
     def test_get_parkingspaces(self):
@@ -63,6 +105,423 @@ class ParkingSpaceNearCenterAPITest(APITestCase):
             response_fail.data["message"], "Bad Request: Missing lat and lon parameters"
         )
 
+    def test_get_parkingspaces_matches_full_scan(self):
+        # * the indexed bounding box lookup should return exactly
+        # * what a haversine scan over the whole table returns
+        center = (TEST_LAT, TEST_LON)
+        expected = {
+            spot.parking_spot_id
+            for spot in ParkingSpace.objects.all()
+            if haversine(
+                center,
+                (float(spot.latitude), float(spot.longitude)),
+                unit=Unit.MILES,
+            )
+            < 1
+        }
+        response = self.client.get(
+            reverse(PARKINGSPACE_GET_API_PATH) + f"?lat={TEST_LAT}&lon={TEST_LON}"
+        )
+        self.assertEqual({spot["parking_spot_id"] for spot in response.data}, expected)
+
+
+@override_settings(PARKING_SPOT_TILE_CACHE_TIMEOUT=0)
+class ParkingSpaceNearCenterQueryCountAPITest(APITestCase):
+    """test the nearby spots endpoint does not run queries per spot"""
+
+    def add_spots(self, count):
+        start = ParkingSpace.objects.count()
+        for i in range(start, start + count):
+            user = User.objects.create_user(
+                username=f"{USERNAME}{i}", email=f"{i}{EMAIL}", password=PASSWORD
+            )
+            UserVerification.objects.create(username=user, status="verified")
+            spot = ParkingSpace.objects.create(
+                parking_spot_id=f"{PARKING_SPOT_ID}-{i}",
+                address_zip=ADDRESS_ZIP,
+                longitude=str(TEST_LON + i * 0.0001),
+                latitude=str(TEST_LAT),
+                parking_spot_name=PARKING_SPOT_NAME,
+                user=user,
+            )
+            for percent in [30, 60]:
+                OccupancyHistory.objects.create(
+                    user=user,
+                    parking_space=spot,
+                    updated_at=timezone.now(),
+                    occupancy_percent=percent,
+                )
+
+    def get_spots(self):
+        return self.client.get(
+            reverse(PARKINGSPACE_GET_API_PATH) + f"?lat={TEST_LAT}&lon={TEST_LON}"
+        )
+
+    def test_constant_query_count(self):
+        for engine in ["index", "database"]:
+            with override_settings(PARKING_SPOT_SEARCH_ENGINE=engine):
+                self.add_spots(2)
+                # * warm up the in-process spot index
+                self.get_spots()
+                # * spots + owners, owner verifications,
+                # * histories + reporters, reporter verifications
+                with self.assertNumQueries(4):
+                    response_few = self.get_spots()
+
+                self.add_spots(20)
+                self.get_spots()
+                with self.assertNumQueries(4):
+                    response_many = self.get_spots()
+
+            self.assertTrue(len(response_many.data) > len(response_few.data))
+            ParkingSpace.objects.all().delete()
+            User.objects.all().delete()
+
+    def test_latest_history(self):
+        self.add_spots(3)
+        self.get_spots()
+        # * spots + owners, owner verifications,
+        # * latest histories + reporters, reporter verifications
+        with self.assertNumQueries(4):
+            response = self.client.get(
+                reverse(PARKINGSPACE_GET_API_PATH)
+                + f"?lat={TEST_LAT}&lon={TEST_LON}&history=latest"
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 3)
+        for spot in response.data:
+            self.assertNotIn("occupancy_history", spot)
+            self.assertNotIn("occupancy_summary", spot)
+            self.assertEqual(spot["latest_update"]["occupancy_percent"], 60)
+            self.assertEqual(
+                spot["latest_update"]["user"]["verification"][0]["status"],
+                "verified",
+            )
+
+        response_summary = self.client.get(
+            reverse(PARKINGSPACE_GET_API_PATH)
+            + f"?lat={TEST_LAT}&lon={TEST_LON}&history=latest&summary=true"
+        )
+        self.assertEqual(
+            response_summary.data[0]["occupancy_summary"],
+            {"history_count": 2, "mean_occupancy_percent": 45},
+        )
+
+        response_bad_mode = self.client.get(
+            reverse(PARKINGSPACE_GET_API_PATH)
+            + f"?lat={TEST_LAT}&lon={TEST_LON}&history=everything"
+        )
+        self.assertEqual(response_bad_mode.status_code, 400)
+
+    def test_latest_history_without_updates(self):
+        ParkingSpace.objects.create(
+            parking_spot_id=PARKING_SPOT_ID,
+            address_zip=ADDRESS_ZIP,
+            longitude=str(TEST_LON),
+            latitude=str(TEST_LAT),
+            parking_spot_name=PARKING_SPOT_NAME,
+        )
+        response = self.client.get(
+            reverse(PARKINGSPACE_GET_API_PATH)
+            + f"?lat={TEST_LAT}&lon={TEST_LON}&history=latest"
+        )
+        self.assertIsNone(response.data[0]["latest_update"])
+
+
+@override_settings(PARKING_SPOT_TILE_CACHE_TIMEOUT=300)
+class ParkingSpaceNearCenterTileCacheAPITest(APITestCase):
+    """test the tile cache of the nearby spots endpoint"""
+
+    def setUp(self):
+        cache.clear()
+        self.test_user = User.objects.create_user(
+            username=USERNAME, email=EMAIL, password=PASSWORD
+        )
+        self.test_spot = ParkingSpace.objects.create(
+            parking_spot_id=PARKING_SPOT_ID,
+            address_zip=ADDRESS_ZIP,
+            longitude=str(TEST_LON),
+            latitude=str(TEST_LAT),
+            parking_spot_name=PARKING_SPOT_NAME,
+        )
+
+    def get_spots(self):
+        return self.client.get(
+            reverse(PARKINGSPACE_GET_API_PATH)
+            + f"?lat={TEST_LAT}&lon={TEST_LON}&history=latest"
+        ).data
+
+    def test_cached_response(self):
+        spots = self.get_spots()
+        self.assertEqual(len(spots), 1)
+        # * coordinates are served as stored, the numeric columns only
+        # * place the spot in its tile
+        self.assertEqual(
+            (spots[0]["latitude"], spots[0]["longitude"]),
+            (str(TEST_LAT), str(TEST_LON)),
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_spots(), spots)
+
+        # * a center in the same area reuses the same tiles
+        with self.assertNumQueries(0):
+            self.client.get(
+                reverse(PARKINGSPACE_GET_API_PATH)
+                + f"?lat={TEST_LAT + 0.001}&lon={TEST_LON}&history=latest"
+            )
+
+    @override_settings(PARKING_SPOT_SEARCH_ENGINE="index")
+    def test_missing_tiles_read_from_database(self):
+        spot_index.ensure_fresh()
+        # * added without signals, like a spot added by another worker whose
+        # * index version bump this worker has not seen
+        ParkingSpace.objects.bulk_create(
+            [
+                ParkingSpace(
+                    parking_spot_id=FAKE_PARKING_SPOT_ID,
+                    longitude=str(TEST_LON),
+                    latitude=str(TEST_LAT),
+                    lon=TEST_LON,
+                    lat=TEST_LAT,
+                )
+            ]
+        )
+        self.assertEqual(len(self.get_spots()), 2)
+
+    def test_invalidated_on_occupancy_change(self):
+        self.get_spots()
+        self.client.login(username=USERNAME, password=PASSWORD)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse(PARKINGSPACE_CHANGE_OCCUPANCY_POST_PATH),
+                {"id": PARKING_SPOT_ID, "percent": 70},
+            )
+        spot = self.get_spots()[0]
+        self.assertEqual(spot["occupancy_percent"], 70)
+        self.assertEqual(spot["latest_update"]["user"]["username"], USERNAME)
+
+    def test_invalidated_on_new_spot(self):
+        self.get_spots()
+        self.client.login(username=USERNAME, password=PASSWORD)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("map:add-parking-space")
+                + f"?lat={TEST_LAT + 0.0001}&lon={TEST_LON}",
+                {
+                    "parking_spot_name": "TEST NAME",
+                    "type": "Street",
+                    "detail": "TEST DETAIL",
+                    "operation_hours": "TEST OP HRS",
+                    "occupancy_percent": 10,
+                },
+            )
+        self.assertEqual(len(self.get_spots()), 2)
+
+
+class ParkingSpaceBoundingBoxAPITest(APITestCase):
+    """test getting parkingspaces inside a map viewport GET"""
+
+    def setUp(self):
+        spots = [
+            ("1", "Street", "STREET A", 20, TEST_LAT),
+            ("2", "Street", "STREET B", 80, TEST_LAT),
+            ("3", "Business", "GARAGE", None, TEST_LAT),
+            ("4", "Business", "FAR GARAGE", 20, TEST_LAT + 1),
+        ]
+        for spot_id, spot_type, name, occupancy, lat in spots:
+            ParkingSpace.objects.create(
+                parking_spot_id=spot_id,
+                type=spot_type,
+                parking_spot_name=name,
+                occupancy_percent=occupancy,
+                address_zip=ADDRESS_ZIP,
+                latitude=str(lat),
+                longitude=str(TEST_LON),
+            )
+
+    def get_spot_ids(self, query=""):
+        response = self.client.get(
+            reverse(PARKINGSPACE_BBOX_GET_API_PATH) + f"?{BBOX}{query}"
+        )
+        self.assertEqual(response.status_code, 200)
+        return sorted(spot["parking_spot_id"] for spot in response.data["results"])
+
+    def test_filters(self):
+        self.assertEqual(self.get_spot_ids(), ["1", "2", "3"])
+        self.assertEqual(self.get_spot_ids("&type=Business"), ["3"])
+        self.assertEqual(self.get_spot_ids("&type=Business,Street"), ["1", "2", "3"])
+        self.assertEqual(self.get_spot_ids("&max_occupancy=50"), ["1", "3"])
+        self.assertEqual(self.get_spot_ids("&max_occupancy=50&has_data=true"), ["1"])
+        self.assertEqual(self.get_spot_ids("&min_occupancy=50&has_data=1"), ["2"])
+        self.assertEqual(self.get_spot_ids("&has_data=false"), ["3"])
+        self.assertEqual(self.get_spot_ids("&name=street"), ["1", "2"])
+
+    def test_pagination(self):
+        response = self.client.get(
+            reverse(PARKINGSPACE_BBOX_GET_API_PATH) + f"?{BBOX}&limit=2"
+        )
+        self.assertEqual(response.data["count"], 3)
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertIsNotNone(response.data["next"])
+        self.assertIn("latest_update", response.data["results"][0])
+
+    def test_bad_request(self):
+        response_missing = self.client.get(reverse(PARKINGSPACE_BBOX_GET_API_PATH))
+        self.assertEqual(response_missing.status_code, 400)
+        self.assertEqual(
+            response_missing.data["message"],
+            "Bad Request: Missing sw_lat, sw_lon, ne_lat or ne_lon parameters",
+        )
+
+        response_not_number = self.client.get(
+            reverse(PARKINGSPACE_BBOX_GET_API_PATH) + f"?{BBOX}&max_occupancy=full"
+        )
+        self.assertEqual(response_not_number.status_code, 400)
+        self.assertEqual(
+            response_not_number.data["message"],
+            "Bad Request: Parameters must be numbers",
+        )
+
+
+class ParkingSpaceClusterAPITest(APITestCase):
+    """test getting clustered parkingspaces GET"""
+
+    def setUp(self):
+        cache.clear()
+        spots = [
+            ("1", "Street", 20, TEST_LAT),
+            ("2", "Street", 60, TEST_LAT + 0.0001),
+            ("3", "Business", None, TEST_LAT + 0.0002),
+            ("4", "Business", 20, TEST_LAT + 1),
+        ]
+        for spot_id, spot_type, occupancy, lat in spots:
+            ParkingSpace.objects.create(
+                parking_spot_id=spot_id,
+                type=spot_type,
+                occupancy_percent=occupancy,
+                address_zip=ADDRESS_ZIP,
+                latitude=str(lat),
+                longitude=str(TEST_LON),
+            )
+
+    def get_clusters(self, zoom):
+        return self.client.get(
+            reverse(PARKINGSPACE_CLUSTERS_GET_API_PATH) + f"?{BBOX}&zoom={zoom}"
+        )
+
+    def test_clusters(self):
+        response = self.get_clusters(10)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["clusters"]), 1)
+        cluster = response.data["clusters"][0]
+        self.assertEqual(cluster["count"], 3)
+        self.assertEqual(cluster["types"], {"Street": 2, "Business": 1})
+        self.assertEqual(cluster["mean_occupancy_percent"], 40)
+        self.assertAlmostEqual(cluster["latitude"], TEST_LAT + 0.0001)
+
+        # * the second request is served from the tile cache
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_clusters(10).data, response.data)
+
+    def test_invalidated_again_on_commit(self):
+        key = clustering.cache_key(
+            10, clustering.tiles_covering(TEST_LAT, TEST_LON, TEST_LAT, TEST_LON, 10)[0]
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            spot = ParkingSpace.objects.get(parking_spot_id="2")
+            spot.occupancy_percent = 100
+            spot.save()
+            self.assertIsNone(cache.get(key))
+            # * a request served before the commit caches the tile again
+            self.get_clusters(10)
+            self.assertIsNotNone(cache.get(key))
+        self.assertIsNone(cache.get(key))
+
+    def test_bad_request(self):
+        self.assertEqual(self.get_clusters(23).status_code, 400)
+        self.assertEqual(self.get_clusters("far").status_code, 400)
+        response_too_many_tiles = self.get_clusters(22)
+        self.assertEqual(response_too_many_tiles.status_code, 400)
+        self.assertEqual(
+            response_too_many_tiles.data["message"],
+            "Bad Request: bbox is too large for this zoom level",
+        )
+
+    def test_large_bbox_rejected_without_building_tiles(self):
+        with patch.object(clustering, "tiles_covering") as tiles_covering:
+            response = self.client.get(
+                reverse(PARKINGSPACE_CLUSTERS_GET_API_PATH)
+                + "?sw_lat=-90&sw_lon=-180&ne_lat=90&ne_lon=180&zoom=22"
+            )
+        self.assertEqual(response.status_code, 400)
+        tiles_covering.assert_not_called()
+        self.assertEqual(
+            clustering.count_tiles_covering(-90, -180, 90, 180, 22),
+            (2**22 + 1) * (2**21 + 1),
+        )
+
+    def test_non_finite_bounds(self):
+        for value in ["nan", "inf", "-inf"]:
+            response = self.client.get(
+                reverse(PARKINGSPACE_CLUSTERS_GET_API_PATH)
+                + f"?sw_lat={value}&sw_lon={TEST_LON}&ne_lat={TEST_LAT}"
+                + f"&ne_lon={TEST_LON}&zoom=10"
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(
+                response.data["message"], "Bad Request: Parameters must be numbers"
+            )
+
+
+class ParkingSpaceForecastAPITest(APITestCase):
+    """test the hourly forecast GET"""
+
+    def setUp(self):
+        # * a fixed clock, so the test never straddles an hour boundary
+        self.now = timezone.now().replace(minute=30)
+        patcher = patch("django.utils.timezone.now", return_value=self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for parking_spot_id in [PARKING_SPOT_ID, FAKE_PARKING_SPOT_ID]:
+            ParkingSpace.objects.create(
+                parking_spot_id=parking_spot_id,
+                address_zip=ADDRESS_ZIP,
+                longitude=TEST_LON,
+                latitude=TEST_LAT,
+                parking_spot_name=PARKING_SPOT_NAME,
+            )
+        OccupancyHistory.objects.create(
+            parking_space_id=PARKING_SPOT_ID,
+            updated_at=timezone.now(),
+            occupancy_percent=80,
+        )
+        call_command("precompute_forecasts", stdout=StringIO())
+
+    def test_forecast(self):
+        response = self.client.get(
+            reverse(PARKINGSPACE_FORECAST_GET_API_PATH) + f"?id={PARKING_SPOT_ID}"
+        )
+        self.assertEqual(response.status_code, 200)
+        forecast = response.data["forecasts"][0]
+        self.assertEqual(forecast["parking_spot_id"], PARKING_SPOT_ID)
+        self.assertEqual(len(forecast["hours"]), 24)
+        self.assertEqual(
+            forecast["hours"][0]["time"],
+            self.now.replace(minute=0, second=0, microsecond=0),
+        )
+        self.assertEqual(forecast["hours"][0]["expected_occupancy_percent"], 80)
+
+        # * spots without data have no forecast
+        response_bbox = self.client.get(
+            reverse(PARKINGSPACE_FORECAST_GET_API_PATH) + f"?{BBOX}"
+        )
+        self.assertEqual(response_bbox.data, response.data)
+
+        response_missing_params = self.client.get(
+            reverse(PARKINGSPACE_FORECAST_GET_API_PATH)
+        )
+        self.assertEqual(response_missing_params.status_code, 400)
+
 
 class ParkingSpaceChangeOccupancyAPITest(APITestCase):
     """test change occupancy POST"""
@@ -179,6 +638,368 @@ class ParkingSpaceChangeOccupancyAPITest(APITestCase):
         )
         self.assertEqual(len(UserWatchedParkingSpace.objects.all()), 0)
 
+    def test_spot_watch_notification_sent_outside_request(self):
+        self.client.login(username=USERNAME, password=PASSWORD)
+        self.client.post(
+            reverse(PARKINGSPACE_CHANGE_OCCUPANCY_POST_PATH),
+            {"id": PARKING_SPOT_ID, "percent": 50},
+        )
+        # * the request only queues the notification
+        self.assertEqual(len(mail.outbox), 0)
+        notification = WatchNotification.objects.get()
+        self.assertEqual(notification.status, "pending")
+        self.assertEqual(notification.user, self.test_user)
+
+        call_command("send_watch_notifications", stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [EMAIL])
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, "sent")
+        self.assertIsNotNone(notification.sent_at)
+
+        # * already sent notifications are not sent again
+        call_command("send_watch_notifications", stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_watch_processing_query_count(self):
+        self.client.login(username=USERNAME, password=PASSWORD)
+
+        def post_with_watchers(count):
+            for i in range(count - UserWatchedParkingSpace.objects.count()):
+                user = User.objects.create_user(
+                    username=f"{USERNAME}{count}{i}",
+                    email=f"{count}{i}{EMAIL}",
+                    password=PASSWORD,
+                )
+                UserWatchedParkingSpace.objects.create(
+                    user=user, parking_space=self.test_spot
+                )
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post(
+                    reverse(PARKINGSPACE_CHANGE_OCCUPANCY_POST_PATH),
+                    {"id": PARKING_SPOT_ID, "percent": 50},
+                )
+            return len(queries)
+
+        one_watcher = post_with_watchers(1)
+        self.assertEqual(post_with_watchers(20), one_watcher)
+        self.assertEqual(WatchNotification.objects.count(), 21)
+        self.assertFalse(UserWatchedParkingSpace.objects.exists())
+
+
+class ParkingSpaceBulkChangeOccupancyAPITest(APITestCase):
+    """test bulk change occupancy POST"""
+
+    def setUp(self):
+        self.test_user = User.objects.create_user(
+            username=USERNAME, email=EMAIL, password=PASSWORD
+        )
+        self.other_user = User.objects.create_user(
+            username=f"{USERNAME}2", email=f"2{EMAIL}", password=PASSWORD
+        )
+        for i in range(3):
+            ParkingSpace.objects.create(
+                parking_spot_id=f"{PARKING_SPOT_ID}{i}",
+                user=self.test_user,
+                address_zip=ADDRESS_ZIP,
+                longitude=LONGITUDE,
+                latitude=LATITUDE,
+                parking_spot_name=PARKING_SPOT_NAME,
+            )
+        ParkingSpace.objects.create(
+            parking_spot_id=FAKE_PARKING_SPOT_ID,
+            user=self.other_user,
+            address_zip=ADDRESS_ZIP,
+            longitude=LONGITUDE,
+            latitude=LATITUDE,
+            parking_spot_name=PARKING_SPOT_NAME,
+        )
+        UserWatchedParkingSpace.objects.create(
+            user=self.other_user,
+            parking_space_id=f"{PARKING_SPOT_ID}0",
+            threshold=50,
+        )
+        UserWatchedParkingSpace.objects.create(
+            user=self.other_user,
+            parking_space_id=f"{PARKING_SPOT_ID}1",
+            threshold=50,
+        )
+
+    def post(self, updates):
+        return self.client.post(
+            reverse(PARKINGSPACE_BULK_CHANGE_OCCUPANCY_POST_PATH),
+            updates,
+            format="json",
+        )
+
+    def test_bulk_change_occupancy(self):
+        updates = [
+            {"id": f"{PARKING_SPOT_ID}{i}", "percent": percent}
+            for i, percent in enumerate([30, 90, 100])
+        ]
+        self.assertEqual(self.post(updates).status_code, 403)
+
+        self.client.login(username=USERNAME, password=PASSWORD)
+        response = self.post(updates)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["updated"], 3)
+        self.assertEqual(
+            dict(
+                ParkingSpace.objects.filter(user=self.test_user).values_list(
+                    "parking_spot_id", "occupancy_percent"
+                )
+            ),
+            {f"{PARKING_SPOT_ID}{i}": p for i, p in enumerate([30, 90, 100])},
+        )
+        self.assertEqual(OccupancyHistory.objects.count(), 3)
+        # * only the watch of the spot below its threshold is triggered
+        notification = WatchNotification.objects.get()
+        self.assertEqual(notification.parking_space_id, f"{PARKING_SPOT_ID}0")
+        self.assertEqual(notification.occupancy_percent, 30)
+        self.assertEqual(UserWatchedParkingSpace.objects.count(), 1)
+
+    def test_bulk_change_occupancy_is_all_or_nothing(self):
+        self.client.login(username=USERNAME, password=PASSWORD)
+
+        response_not_a_list = self.post({"id": PARKING_SPOT_ID, "percent": 10})
+        self.assertEqual(response_not_a_list.status_code, 400)
+        self.assertEqual(
+            response_not_a_list.data["message"],
+            "Bad Request: Expected a list of updates",
+        )
+
+        response_invalid_percent = self.post(
+            [
+                {"id": f"{PARKING_SPOT_ID}0", "percent": 10},
+                {"id": f"{PARKING_SPOT_ID}1", "percent": 15},
+            ]
+        )
+        self.assertEqual(response_invalid_percent.status_code, 400)
+        self.assertEqual(
+            response_invalid_percent.data["message"],
+            "Bad Request: Update 1: Percent is not a multiple of 10",
+        )
+
+        response_duplicate = self.post(
+            [
+                {"id": f"{PARKING_SPOT_ID}0", "percent": 10},
+                {"id": f"{PARKING_SPOT_ID}0", "percent": 20},
+            ]
+        )
+        self.assertEqual(
+            response_duplicate.data["message"],
+            "Bad Request: Update 1: Duplicate id",
+        )
+
+        # * spots of other users can not be updated
+        response_not_owned = self.post(
+            [
+                {"id": f"{PARKING_SPOT_ID}0", "percent": 10},
+                {"id": FAKE_PARKING_SPOT_ID, "percent": 10},
+            ]
+        )
+        self.assertEqual(response_not_owned.status_code, 400)
+        self.assertEqual(response_not_owned.data["ids"], [FAKE_PARKING_SPOT_ID])
+
+        self.assertFalse(OccupancyHistory.objects.exists())
+        self.assertFalse(
+            ParkingSpace.objects.filter(occupancy_percent__isnull=False).exists()
+        )
+
+    def test_bulk_change_occupancy_rejects_invalid_percents(self):
+        self.client.login(username=USERNAME, password=PASSWORD)
+
+        for percent, error in [
+            ([10], "Percent must be an integer"),
+            ({}, "Percent must be an integer"),
+            (50.7, "Percent must be an integer"),
+            (50.0, "Percent must be an integer"),
+            (True, "Percent must be an integer"),
+            (-10, "Percent is <0"),
+            ("-10", "Percent can only have digits"),
+            ("５０", "Percent can only have digits"),
+        ]:
+            with self.subTest(percent=percent):
+                response = self.post(
+                    [{"id": f"{PARKING_SPOT_ID}0", "percent": percent}]
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(
+                    response.data["message"], f"Bad Request: Update 0: {error}"
+                )
+
+        response = self.post([{"id": f"{PARKING_SPOT_ID}0", "percent": "50"}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            OccupancyHistory.objects.values_list("occupancy_percent", flat=True).get(),
+            50,
+        )
+
+    def test_bulk_change_occupancy_query_count(self):
+        self.client.login(username=USERNAME, password=PASSWORD)
+
+        def query_count(spot_count):
+            updates = [
+                {"id": f"{PARKING_SPOT_ID}{i}", "percent": 60}
+                for i in range(spot_count)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.post(updates).status_code, 200)
+            return len(queries)
+
+        self.assertEqual(query_count(3), query_count(1))
+
+
+@skipUnlessDBFeature("has_select_for_update")
+@override_settings(WATCH_NOTIFICATION_DISPATCH="worker")
+class ParkingSpaceChangeOccupancyConcurrencyTest(TransactionTestCase):
+    """concurrent occupancy reports of the same spot"""
+
+    THREADS = 8
+
+    def setUp(self):
+        self.test_spot = ParkingSpace.objects.create(
+            parking_spot_id=PARKING_SPOT_ID,
+            address_zip=ADDRESS_ZIP,
+            longitude=LONGITUDE,
+            latitude=LATITUDE,
+            parking_spot_name=PARKING_SPOT_NAME,
+        )
+        self.users = [
+            User.objects.create_user(
+                username=f"{USERNAME}{i}", email=f"{i}{EMAIL}", password=PASSWORD
+            )
+            for i in range(self.THREADS)
+        ]
+        UserWatchedParkingSpace.objects.create(
+            user=self.users[0], parking_space=self.test_spot, threshold=100
+        )
+
+    def report(self, user, percent):
+        client = APIClient()
+        client.force_login(user)
+        try:
+            return client.post(
+                reverse(PARKINGSPACE_CHANGE_OCCUPANCY_POST_PATH),
+                {"id": PARKING_SPOT_ID, "percent": percent},
+            ).status_code
+        finally:
+            connections.close_all()
+
+    def test_no_lost_updates(self):
+        with ThreadPoolExecutor(max_workers=self.THREADS) as executor:
+            status_codes = list(
+                executor.map(
+                    self.report, self.users, [i * 10 for i in range(self.THREADS)]
+                )
+            )
+        self.assertEqual(status_codes, [200] * self.THREADS)
+
+        history = OccupancyHistory.objects.filter(parking_space=self.test_spot)
+        self.assertEqual(history.count(), self.THREADS)
+        # * the spot holds the occupancy of the last applied report
+        self.test_spot.refresh_from_db()
+        self.assertEqual(
+            self.test_spot.occupancy_percent,
+            history.order_by("-id").first().occupancy_percent,
+        )
+        # * the watch was triggered exactly once
+        self.assertEqual(WatchNotification.objects.count(), 1)
+        self.assertFalse(UserWatchedParkingSpace.objects.exists())
+
+
+class WatchNotificationSendingTest(APITestCase):
+    """tests for sending the queued watch notifications"""
+
+    def setUp(self):
+        self.test_spot = ParkingSpace.objects.create(
+            parking_spot_id=PARKING_SPOT_ID,
+            address_zip=ADDRESS_ZIP,
+            longitude=LONGITUDE,
+            latitude=LATITUDE,
+            parking_spot_name=PARKING_SPOT_NAME,
+        )
+        for i in range(3):
+            user = User.objects.create_user(
+                username=f"{USERNAME}{i}", email=f"{i}{EMAIL}", password=PASSWORD
+            )
+            WatchNotification.objects.create(
+                user=user,
+                parking_space=self.test_spot,
+                occupancy_percent=50,
+                domain="testserver",
+            )
+
+    def test_file_based_backend(self):
+        with tempfile.TemporaryDirectory() as email_dir:
+            with override_settings(
+                EMAIL_BACKEND="django.core.mail.backends.filebased.EmailBackend",
+                EMAIL_FILE_PATH=email_dir,
+            ):
+                sent, failed = send_pending_notifications(batch_size=2)
+            # * one file per connection, i.e. per batch
+            self.assertEqual(len(os.listdir(email_dir)), 2)
+        self.assertEqual((sent, failed), (3, 0))
+        self.assertEqual(WatchNotification.objects.filter(status="sent").count(), 3)
+
+    @override_settings(EMAIL_BACKEND="api.tests.FailingEmailBackend")
+    def test_failures_are_retried(self):
+        sent, failed = send_pending_notifications()
+        self.assertEqual((sent, failed), (2, 1))
+        failed_notification = WatchNotification.objects.get(status="pending")
+        self.assertEqual(failed_notification.user.email, f"1{EMAIL}")
+        self.assertEqual(failed_notification.attempts, 1)
+        self.assertEqual(failed_notification.last_error, "mailbox unavailable")
+
+        for _ in range(MAX_ATTEMPTS - 1):
+            send_pending_notifications()
+        failed_notification.refresh_from_db()
+        self.assertEqual(failed_notification.status, "failed")
+        self.assertEqual(failed_notification.attempts, MAX_ATTEMPTS)
+
+    @override_settings(EMAIL_BACKEND="api.tests.FailingEmailBackend")
+    def test_background_sender_retries_failures(self):
+        ids = list(WatchNotification.objects.values_list("id", flat=True))
+        # * the test database connection must stay open
+        with patch("api.notifications.connections"), patch(
+            "api.notifications._schedule_retry"
+        ) as mock_retry:
+            _send_in_background(ids)
+            for attempt in range(1, MAX_ATTEMPTS):
+                mock_retry.assert_called_once_with(ids, attempt)
+                mock_retry.reset_mock()
+                _send_in_background(ids, attempt + 1)
+            mock_retry.assert_not_called()
+
+        failed_notification = WatchNotification.objects.exclude(status="sent").get()
+        self.assertEqual(failed_notification.status, "failed")
+        self.assertEqual(failed_notification.attempts, MAX_ATTEMPTS)
+
+    def test_only_given_ids(self):
+        notification = WatchNotification.objects.first()
+        sent, failed = send_pending_notifications(ids=[notification.id])
+        self.assertEqual((sent, failed), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(
+            list(WatchNotification.objects.filter(status="sent")), [notification]
+        )
+
+    def test_messages_share_one_connection(self):
+        notifications = list(WatchNotification.objects.select_related("user"))
+        email_connection = mail.get_connection()
+        with patch.object(
+            email_connection, "open", wraps=email_connection.open
+        ) as mock_open, patch.object(
+            email_connection, "send_messages", wraps=email_connection.send_messages
+        ) as mock_send:
+            sent, failed = send_notifications(
+                notifications, connection=email_connection
+            )
+        self.assertEqual((sent, failed), (3, 0))
+        mock_open.assert_called_once()
+        self.assertEqual(mock_send.call_count, 3)
+        self.assertTrue(all(n.status == "sent" for n in notifications))
+
 
 class AddWatchOnParkingSpaceAPITest(APITestCase):
     """tests for adding watch on parking space's API"""
@@ -11,11 +11,31 @@ urlpatterns = [
         views.ParkingSpaceNearCenterAPIView.as_view(),
         name="spots-near-center",
     ),
+    path(
+        "spots/bbox/",
+        views.ParkingSpaceBoundingBoxAPIView.as_view(),
+        name="spots-in-bbox",
+    ),
+    path(
+        "spots/clusters/",
+        views.ParkingSpaceClusterAPIView.as_view(),
+        name="spot-clusters",
+    ),
+    path(
+        "spots/forecast/",
+        views.ParkingSpaceForecastAPIView.as_view(),
+        name="spot-forecast",
+    ),
     path(
         "spot/occupancy/",
         views.ParkingSpaceChangeOccupancyAPIView.as_view(),
         name="change-occupancy",
     ),
+    path(
+        "spot/occupancy/bulk/",
+        views.ParkingSpaceBulkChangeOccupancyAPIView.as_view(),
+        name="bulk-change-occupancy",
+    ),
     path(
         "spot/posts/<str:spotId>/",
         views.ParkingSpacePostsAPIView.as_view(),
@@ -1,22 +1,45 @@
+import math
+from typing import Optional
+from collections import defaultdict
 from rest_framework import status
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
-from django.template import loader
 from django.http import HttpRequest
 from rest_framework import generics
+from django.db.models import (
+    Case,
+    Count,
+    F,
+    FloatField,
+    OuterRef,
+    Prefetch,
+    Q,
+    Subquery,
+    Sum,
+    When,
+    Window,
+)
+from django.db.models.functions import Cast, Coalesce, RowNumber
 from haversine import haversine, Unit
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.pagination import LimitOffsetPagination
 from django.contrib.auth import get_user_model
-from django.shortcuts import get_object_or_404
-from django.core.mail import EmailMultiAlternatives
 from rest_framework.permissions import IsAuthenticated
 from django.contrib.sites.shortcuts import get_current_site
 from rest_framework.authentication import SessionAuthentication
 
-from map.models import ParkingSpace, OccupancyHistory
+from map.models import ParkingSpace, OccupancyHistory, OccupancyRollup
+from map import clustering, forecasts, peak_times, tile_cache
+from map.geo import bounding_box
+from map.signals import spot_changed
+from map.spatial import spot_index
 from users.models import Post, Comment, UserWatchedParkingSpace
+from . import notifications
 from .serializers import (
     ParkingSpaceSerializer,
+    ParkingSpaceCompactSerializer,
     PostSerializer,
     UserWatchedParkingSpaceSerializer,
 )
@@ -29,13 +52,148 @@ custom_badwords = ["bullshittery", "bitchy"]
 User = get_user_model()
 
 
-class ParkingSpaceNearCenterAPIView(generics.ListAPIView):
-    """API endpoint
-    /api/spots/?lat=LATITUDE&lon=LONGITUDE
+class ParkingSpaceHistoryMixin:
+    """shared history=full|latest and summary=true handling of the spot
+    list endpoints, see ParkingSpaceNearCenterAPIView
     """
 
     queryset = ParkingSpace.objects.all()
     serializer_class = ParkingSpaceSerializer
+    compact_serializer_class = ParkingSpaceCompactSerializer
+    history_modes = ["full", "latest"]
+    default_history_mode = "full"
+
+    def parse_history_params(self, request: HttpRequest) -> Optional[Response]:
+        """read history and summary query parameters
+
+        Returns:
+            Optional[Response]: 400 response if history is not supported
+        """
+        self.history_mode = request.GET.get("history", self.default_history_mode)
+        if self.history_mode not in self.history_modes:
+            response_data = {
+                "message": "Bad Request: history must be one of "
+                + ", ".join(self.history_modes)
+            }
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+        self.summary = request.GET.get("summary", "").lower() in ["1", "true"]
+        return None
+
+    def round_occupancy(self, spots):
+        for spot in spots:
+            if spot.occupancy_percent:
+                spot.occupancy_percent = round(spot.occupancy_percent / 10) * 10
+        return spots
+
+    def get_serializer_class(self):
+        if self.history_mode == "latest":
+            return self.compact_serializer_class
+        return self.serializer_class
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), "summary": self.summary}
+
+    def get_queryset(self):
+        """spots with everything the serializer nests loaded up front,
+        so the number of queries does not grow with the number of spots
+        """
+        queryset = self.queryset.select_related("user").prefetch_related(
+            "user__verification"
+        )
+        history = OccupancyHistory.objects.select_related("user")
+
+        if self.history_mode == "latest":
+            latest_history = history.annotate(
+                recency=Window(
+                    RowNumber(), partition_by=["parking_space"], order_by="-id"
+                )
+            ).filter(recency=1)
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    "occupancy_history",
+                    queryset=latest_history,
+                    to_attr="latest_updates",
+                ),
+                "latest_updates__user__verification",
+            )
+            if self.summary:
+                queryset = self.annotate_summary(queryset)
+            return queryset
+
+        return queryset.prefetch_related(
+            Prefetch("occupancy_history", queryset=history.order_by("id")),
+            "occupancy_history__user__verification",
+        )
+
+    def annotate_summary(self, queryset):
+        """add the number of reports and the mean reported occupancy of each
+        spot, over its raw history and the rollups of its older reports"""
+        queryset = queryset.annotate(
+            **spot_totals(
+                OccupancyHistory.objects,
+                raw_count=Count("id"),
+                raw_occupancy_count=Count("occupancy_percent"),
+                raw_occupancy_sum=Sum("occupancy_percent"),
+            ),
+            **spot_totals(
+                OccupancyRollup.objects,
+                rolled_up_count=Sum("report_count"),
+                rolled_up_occupancy_count=Sum("occupancy_count"),
+                rolled_up_occupancy_sum=Sum("occupancy_sum"),
+            ),
+        ).annotate(
+            history_count=F("raw_count") + F("rolled_up_count"),
+            reported_occupancy_count=F("raw_occupancy_count")
+            + F("rolled_up_occupancy_count"),
+            reported_occupancy_sum=F("raw_occupancy_sum")
+            + F("rolled_up_occupancy_sum"),
+        )
+        return queryset.annotate(
+            mean_occupancy_percent=Case(
+                When(
+                    reported_occupancy_count__gt=0,
+                    then=Cast("reported_occupancy_sum", FloatField())
+                    / Cast("reported_occupancy_count", FloatField()),
+                ),
+                default=None,
+                output_field=FloatField(),
+            )
+        )
+
+
+def spot_totals(queryset, **aggregates) -> dict:
+    """annotations of aggregates over the rows of each spot
+
+    Each aggregate is a correlated subquery, so aggregates over several
+    related tables do not multiply each other as joins would.
+
+    Args:
+        queryset: rows with a parking_space foreign key
+        aggregates: aggregate of each annotation name
+
+    Returns:
+        dict: annotations, 0 for spots without rows
+    """
+    rows = queryset.filter(parking_space=OuterRef("pk")).order_by()
+    rows = rows.values("parking_space")
+    return {
+        name: Coalesce(Subquery(rows.annotate(total=aggregate).values("total")), 0)
+        for name, aggregate in aggregates.items()
+    }
+
+
+class ParkingSpaceNearCenterAPIView(ParkingSpaceHistoryMixin, generics.ListAPIView):
+    """API endpoint
+    /api/spots/?lat=LATITUDE&lon=LONGITUDE[&history=full|latest][&summary=true]
+
+    history=full (default) : every occupancy update of each spot
+    history=latest : only the latest update of each spot (used by the map)
+    summary=true : with history=latest, adds the number of updates
+    and the mean reported occupancy of each spot
+    """
+
+    # * search radius around the center, in miles
+    max_dist = 1
 
     def get(self, request: HttpRequest) -> Response:
         """handles get requests to API endpoint above
@@ -46,8 +204,7 @@ class ParkingSpaceNearCenterAPIView(generics.ListAPIView):
         Returns:
             Response: JSON Object with either message requesting
             lat and lon as query parameters OR on success
-            the parking spots within distance
-            (specified in __is_within_dist method)
+            the parking spots within max_dist miles
         """
         lat = request.GET.get("lat")
         lon = request.GET.get("lon")
@@ -56,31 +213,311 @@ class ParkingSpaceNearCenterAPIView(generics.ListAPIView):
             response_data = {"message": "Bad Request: Missing lat and lon parameters"}
             return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
 
+        error_response = self.parse_history_params(request)
+        if error_response:
+            return error_response
+
         center_point = (float(lat), float(lon))
-        filtered_spots = [
-            spot
-            for spot in self.queryset.all()
-            if self.__is_within_dist(
-                center_point, (float(spot.latitude), float(spot.longitude))
+        if settings.PARKING_SPOT_TILE_CACHE_TIMEOUT:
+            return Response(
+                self.get_cached_spots_near(center_point), status=status.HTTP_200_OK
             )
-        ]
 
-        for spot in filtered_spots:
-            if spot.occupancy_percent:
-                spot.occupancy_percent = round(spot.occupancy_percent / 10) * 10
+        filtered_spots = self.round_occupancy(self.get_spots_near(center_point))
 
-        serializer = self.serializer_class(filtered_spots, many=True)
+        serializer = self.get_serializer(filtered_spots, many=True)
 
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    def get_cached_spots_near(self, center_point):
+        """serialized spots within max_dist of center_point, assembled from
+        the cached tiles covering the search circle (see map/tile_cache.py)
+        """
+        variant = self.history_mode + ("-summary" if self.summary else "")
+        tiles = tile_cache.tiles_in_bbox(*bounding_box(center_point, self.max_dist))
+        payloads = tile_cache.get_tiles(variant, tiles, self.__load_tiles)
+        return tile_cache.spots_within(payloads, center_point, self.max_dist)
+
+    def __load_tiles(self, tiles):
+        """(lat, lon, serialized spot) of the spots of each tile, for the
+        tile cache, read with a query on the (lat, lon) index"""
+        bbox = tile_cache.tiles_bbox(tiles)
+        spots = self.round_occupancy(list(self.get_queryset().within_bbox(*bbox)))
+        loaded = defaultdict(list)
+        for spot, data in zip(spots, self.get_serializer(spots, many=True).data):
+            loaded[tile_cache.tile_of(spot.lat, spot.lon)].append(
+                (spot.lat, spot.lon, data)
+            )
+        return loaded
+
+    def get_spots_near(self, center_point):
+        """spots within max_dist of center_point, using the configured engine"""
+        queryset = self.get_queryset()
+        if settings.PARKING_SPOT_SEARCH_ENGINE == "index":
+            nearby_ids = spot_index.nearby_ids(center_point, self.max_dist)
+            return list(queryset.filter(parking_spot_id__in=nearby_ids))
+
+        # * the bounding box prefilter runs on the (lat, lon) index,
+        # * only the candidates inside it get an exact distance check
+        return [
+            spot
+            for spot in queryset.around(center_point, self.max_dist)
+            if self.__is_within_dist(center_point, (spot.lat, spot.lon))
+        ]
+
     def __is_within_dist(self, p1, p2):
-        """method to create a normal user
+        """check the exact distance between two points
 
         Returns:
             Boolean: p1 is within max_dist of p2
         """
-        max_dist = 1
-        return haversine(p1, p2, unit=Unit.MILES) < max_dist
+        return haversine(p1, p2, unit=Unit.MILES) < self.max_dist
+
+
+class ParkingSpaceBoundingBoxPagination(LimitOffsetPagination):
+    default_limit = 500
+    max_limit = 2000
+
+
+class ParkingSpaceBoundingBoxAPIView(ParkingSpaceHistoryMixin, generics.ListAPIView):
+    """API endpoint
+    /api/spots/bbox/?sw_lat=LAT&sw_lon=LON&ne_lat=LAT&ne_lon=LON
+
+    Optional filters:
+        type : spot type, repeatable or comma separated (type=Street,Business)
+        min_occupancy / max_occupancy : occupancy percent range, only
+        applied to spots that have occupancy data
+        has_data : true for spots with occupancy data only,
+        false for spots without occupancy data only
+        name : case insensitive substring of the spot name
+        history / summary : see ParkingSpaceNearCenterAPIView,
+        defaults to history=latest
+        limit / offset : pagination, at most max_limit spots per page
+    """
+
+    default_history_mode = "latest"
+    pagination_class = ParkingSpaceBoundingBoxPagination
+    bbox_params = ["sw_lat", "sw_lon", "ne_lat", "ne_lon"]
+
+    def get(self, request: HttpRequest) -> Response:
+        """handles get requests to API endpoint above
+
+        Args:
+            request (HttpRequest): http request object
+
+        Returns:
+            Response: paginated JSON Object with the matching spots OR
+            message describing the invalid query parameters
+        """
+        try:
+            south, west, north, east = [
+                float(request.GET[param]) for param in self.bbox_params
+            ]
+            min_occupancy = self.__get_optional_int(request, "min_occupancy")
+            max_occupancy = self.__get_optional_int(request, "max_occupancy")
+        except KeyError:
+            response_data = {
+                "message": "Bad Request: Missing sw_lat, sw_lon, ne_lat or ne_lon parameters"
+            }
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError:
+            response_data = {"message": "Bad Request: Parameters must be numbers"}
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+
+        error_response = self.parse_history_params(request)
+        if error_response:
+            return error_response
+
+        queryset = self.get_queryset().within_bbox(south, west, north, east)
+
+        types = [
+            spot_type
+            for param in request.GET.getlist("type")
+            for spot_type in param.split(",")
+            if spot_type
+        ]
+        if types:
+            queryset = queryset.filter(type__in=types)
+
+        occupancy_range = Q()
+        if min_occupancy is not None:
+            occupancy_range &= Q(occupancy_percent__gte=min_occupancy)
+        if max_occupancy is not None:
+            occupancy_range &= Q(occupancy_percent__lte=max_occupancy)
+
+        has_data = request.GET.get("has_data", "").lower()
+        if has_data in ["1", "true"]:
+            queryset = queryset.filter(occupancy_range, occupancy_percent__isnull=False)
+        elif has_data in ["0", "false"]:
+            queryset = queryset.filter(occupancy_percent__isnull=True)
+        elif occupancy_range:
+            queryset = queryset.filter(
+                occupancy_range | Q(occupancy_percent__isnull=True)
+            )
+
+        name = request.GET.get("name")
+        if name:
+            queryset = queryset.filter(parking_spot_name__icontains=name)
+
+        page = self.paginate_queryset(queryset.order_by("parking_spot_id"))
+        serializer = self.get_serializer(self.round_occupancy(page), many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def __get_optional_int(self, request: HttpRequest, param: str) -> Optional[int]:
+        value = request.GET.get(param)
+        return None if value in [None, ""] else int(value)
+
+
+class ParkingSpaceClusterAPIView(APIView):
+    """API endpoint
+    /api/spots/clusters/?sw_lat=LAT&sw_lon=LON&ne_lat=LAT&ne_lon=LON&zoom=ZOOM
+
+    Aggregated spots for zoomed out map views, see map/clustering.py.
+    Each cluster has its centroid, spot count, mean occupancy percent
+    (null without occupancy data) and spot count per type.
+    """
+
+    bbox_params = ["sw_lat", "sw_lon", "ne_lat", "ne_lon"]
+
+    def get(self, request: HttpRequest) -> Response:
+        """handles get requests to API endpoint above
+
+        Args:
+            request (HttpRequest): http request object
+
+        Returns:
+            Response: JSON Object with the clusters of the tiles covering
+            the bbox OR message describing the invalid query parameters
+        """
+        try:
+            south, west, north, east = [
+                float(request.GET[param]) for param in self.bbox_params
+            ]
+            zoom = int(request.GET["zoom"])
+            if not all(map(math.isfinite, [south, west, north, east])):
+                # * nan / inf bounds have no tile
+                raise ValueError
+        except KeyError:
+            response_data = {
+                "message": "Bad Request: Missing sw_lat, sw_lon, ne_lat, ne_lon or zoom parameters"
+            }
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError:
+            response_data = {"message": "Bad Request: Parameters must be numbers"}
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+
+        if not 0 <= zoom <= clustering.MAX_ZOOM:
+            response_data = {
+                "message": f"Bad Request: zoom must be between 0 and {clustering.MAX_ZOOM}"
+            }
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+
+        # * counted from the tile ranges, a large bbox at a high zoom would
+        # * otherwise build millions of tiles before being rejected
+        tile_count = clustering.count_tiles_covering(south, west, north, east, zoom)
+        if tile_count > clustering.MAX_TILES:
+            response_data = {
+                "message": "Bad Request: bbox is too large for this zoom level"
+            }
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+
+        tiles = clustering.tiles_covering(south, west, north, east, zoom)
+
+        return Response(
+            {"zoom": zoom, "clusters": clustering.get_clusters(tiles, zoom)},
+            status=status.HTTP_200_OK,
+        )
+
+
+class ParkingSpaceForecastAPIView(APIView):
+    """API endpoint
+    /api/spots/forecast/?id=PARKING_SPACE_ID
+    /api/spots/forecast/?sw_lat=LAT&sw_lon=LON&ne_lat=LAT&ne_lon=LON
+
+    Expected occupancy percent of a spot, or of the spots of a bbox (at
+    most max_spots), for each of the next 24 hours starting with the
+    current one, see map/forecasts.py. Spots without any occupancy data
+    are left out.
+    """
+
+    bbox_params = ["sw_lat", "sw_lon", "ne_lat", "ne_lon"]
+    max_spots = 500
+
+    def get(self, request: HttpRequest) -> Response:
+        """handles get requests to API endpoint above
+
+        Args:
+            request (HttpRequest): http request object
+
+        Returns:
+            Response: JSON Object with the forecasts OR
+            message describing the invalid query parameters
+        """
+        parking_spot_id = request.GET.get("id")
+        if parking_spot_id:
+            parking_spot_ids = [parking_spot_id]
+        else:
+            try:
+                south, west, north, east = [
+                    float(request.GET[param]) for param in self.bbox_params
+                ]
+            except KeyError:
+                response_data = {
+                    "message": "Bad Request: Missing id or sw_lat, sw_lon, ne_lat, ne_lon parameters"
+                }
+                return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+            except ValueError:
+                response_data = {"message": "Bad Request: Parameters must be numbers"}
+                return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+            parking_spot_ids = list(
+                ParkingSpace.objects.within_bbox(south, west, north, east)
+                .filter(forecast__isnull=False)
+                .order_by("parking_spot_id")
+                .values_list("parking_spot_id", flat=True)[: self.max_spots]
+            )
+
+        spot_forecasts = forecasts.forecasts_for(parking_spot_ids)
+        return Response(
+            {
+                "forecasts": [
+                    {"parking_spot_id": spot_id, **spot_forecasts[spot_id]}
+                    for spot_id in parking_spot_ids
+                    if spot_id in spot_forecasts
+                ]
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+def validate_occupancy_update(parking_spot_id, occupancy_percent) -> Optional[str]:
+    """check the id and percent of an occupancy report
+
+    Args:
+        parking_spot_id: id of the reported spot
+        occupancy_percent: reported occupancy, an int or a string of digits
+
+    Returns:
+        Optional[str]: what is wrong with the report, None if it is valid
+    """
+    if not ((occupancy_percent is not None) and parking_spot_id):
+        return "Missing percent or id parameters"
+    # * bool is an int subclass, floats would be truncated by int()
+    if isinstance(occupancy_percent, bool) or not isinstance(
+        occupancy_percent, (int, str)
+    ):
+        return "Percent must be an integer"
+    if isinstance(occupancy_percent, str) and not (
+        occupancy_percent.isascii() and occupancy_percent.isdigit()
+    ):
+        return "Percent can only have digits"
+    occupancy_percent = int(occupancy_percent)
+    if occupancy_percent < 0:
+        return "Percent is <0"
+    if occupancy_percent > 100:
+        return "Percent is >100"
+    if occupancy_percent % 10 != 0:
+        return "Percent is not a multiple of 10"
+    return None
 
 
 class ParkingSpaceChangeOccupancyAPIView(APIView):
@@ -93,10 +530,6 @@ class ParkingSpaceChangeOccupancyAPIView(APIView):
     permission_classes = [IsAuthenticated]
     authentication_classes = [SessionAuthentication]
 
-    extra_email_context = {"site_name": "Parkrowd"}
-    email_template_name = "api/parkingspace_status_update_email_template.html"
-    subject_template_name = "api/parkingspace_status_update_email_subject_template.txt"
-
     def post(self, request: HttpRequest) -> Response:
         """handles post requests to API endpoint above
 
@@ -112,69 +545,43 @@ class ParkingSpaceChangeOccupancyAPIView(APIView):
         parking_spot_id = request.data.get("id")
         available_vehicle_spaces = request.data.get("available_vehicle_spaces")
 
-        if not ((occupancy_percent is not None) and parking_spot_id):
-            response_data = {"message": "Bad Request: Missing percent or id parameters"}
+        error = validate_occupancy_update(parking_spot_id, occupancy_percent)
+        if error:
+            response_data = {"message": f"Bad Request: {error}"}
             return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
-
-        if isinstance(occupancy_percent, str) and not occupancy_percent.isdigit():
-            response_data = {"message": "Bad Request: Percent can only have digits"}
-            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
-
         occupancy_percent = int(occupancy_percent)
-        if occupancy_percent > 100:
-            response_data = {"message": "Bad Request: Percent is >100"}
-            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
-        if occupancy_percent % 10 != 0:
-            response_data = {"message": "Bad Request: Percent is not a multiple of 10"}
-            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            # * Retrieve the ParkingSpace instance
-            parking_space = ParkingSpace.objects.get(parking_spot_id=parking_spot_id)
-
-            # Update the occupancy_percent field
-            parking_space.occupancy_percent = occupancy_percent
-
-            # Update the available_vehicle_spaces
-            parking_space.available_vehicle_spaces = available_vehicle_spaces
-
-            # Create New Occupancy History
-            history = OccupancyHistory()
-            history.user = request.user
-            history.parking_space = get_object_or_404(
-                ParkingSpace, parking_spot_id=parking_spot_id
-            )
-            history.updated_at = timezone.now()
-            history.occupancy_percent = occupancy_percent
+            with transaction.atomic():
+                # * lock the spot row, concurrent reports of the same spot
+                # * are applied one after the other
+                parking_space = (
+                    ParkingSpace.objects.select_for_update()
+                    .only("parking_spot_id", "lat", "lon")
+                    .get(parking_spot_id=parking_spot_id)
+                )
+                ParkingSpace.objects.filter(pk=parking_space.pk).update(
+                    occupancy_percent=occupancy_percent,
+                    available_vehicle_spaces=available_vehicle_spaces,
+                )
 
-            parking_space.save()
-            history.save()
+                # * update() skips the ParkingSpace signals, the cached tiles
+                # * and clusters of the spot are dropped by the history ones
+                OccupancyHistory.objects.create(
+                    user=request.user,
+                    parking_space=parking_space,
+                    updated_at=timezone.now(),
+                    occupancy_percent=occupancy_percent,
+                )
 
-            # send emails to users that put a watch on this spot
-            current_site = get_current_site(request)
-            email_field_name = User.get_email_field_name()
-            user_watches = UserWatchedParkingSpace.objects.filter(
-                parking_space=parking_space, threshold__gte=occupancy_percent
-            )
-            domain = current_site.domain
-
-            for record in user_watches:
-                user_email = getattr(record.user, email_field_name)
-                context = {
-                    "user": record.user,
-                    "email": user_email,
-                    "domain": domain,
-                    "protocol": "https" if self.request.is_secure() else "http",
-                    **(self.extra_email_context or {}),
-                }
-                self.send_mail(
-                    self.subject_template_name,
-                    self.email_template_name,
-                    context,
-                    None,
-                    user_email,
+                # queue emails to users that put a watch on this spot,
+                # they are sent outside of this request (see api/notifications.py)
+                watch_notifications = notifications.queue_watch_notifications(
+                    {parking_space.parking_spot_id: occupancy_percent},
+                    get_current_site(request).domain,
+                    "https" if request.is_secure() else "http",
                 )
-                record.delete()
+            notifications.dispatch(watch_notifications)
 
             return Response(
                 {"message": "Occupancy percent updated successfully."},
@@ -193,29 +600,130 @@ class ParkingSpaceChangeOccupancyAPIView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
-    def send_mail(
-        self,
-        subject_template_name,
-        email_template_name,
-        context,
-        from_email,
-        to_email,
-        html_email_template_name=None,
-    ):
-        """
-        Send a django.core.mail.EmailMultiAlternatives to `to_email`.
+
+class ParkingSpaceBulkChangeOccupancyAPIView(APIView):
+    """API endpoint
+    /api/spot/occupancy/bulk/
+
+    Changes the Occupancy Percent of many Parking Spaces owned by the user
+    at once. The body is a JSON list of
+    {"id": ..., "percent": ..., "available_vehicle_spaces": ...} entries,
+    either all of them are applied or none.
+    """
+
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [SessionAuthentication]
+    max_entries = 500
+
+    def post(self, request: HttpRequest) -> Response:
+        """handles post requests to API endpoint above
+
+        Args:
+            request (HttpRequest): http request object
+
+        Returns:
+            Response: JSON Object with the number of updated spots
+            on success OR
+            fail message to update front end
         """
-        subject = loader.render_to_string(subject_template_name, context)
-        # Email subject *must not* contain newlines
-        subject = "".join(subject.splitlines())
-        body = loader.render_to_string(email_template_name, context)
+        entries = request.data
+        if not isinstance(entries, list) or not entries:
+            response_data = {"message": "Bad Request: Expected a list of updates"}
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+        if len(entries) > self.max_entries:
+            response_data = {
+                "message": f"Bad Request: At most {self.max_entries} updates at once"
+            }
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+
+        updates = {}
+        for index, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                error = "Expected an object"
+            else:
+                error = validate_occupancy_update(entry.get("id"), entry.get("percent"))
+            if not error and str(entry["id"]) in updates:
+                error = "Duplicate id"
+            if error:
+                response_data = {"message": f"Bad Request: Update {index}: {error}"}
+                return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+            updates[str(entry["id"])] = (
+                int(entry["percent"]),
+                entry.get("available_vehicle_spaces"),
+            )
+
+        try:
+            with transaction.atomic():
+                # * lock the spots in a fixed order, so two bulk updates
+                # * sharing spots never deadlock
+                parking_spaces = list(
+                    ParkingSpace.objects.select_for_update()
+                    .filter(user=request.user, parking_spot_id__in=updates)
+                    .only("parking_spot_id", "lat", "lon")
+                    .order_by("parking_spot_id")
+                )
+                unknown = set(updates) - {
+                    parking_space.parking_spot_id for parking_space in parking_spaces
+                }
+                if unknown:
+                    return Response(
+                        {
+                            "message": "ParkingSpace with the specified id does not "
+                            "exist or is not owned by the user.",
+                            "ids": sorted(unknown),
+                        },
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+
+                updated_at = timezone.now()
+                histories = []
+                for parking_space in parking_spaces:
+                    occupancy_percent, available_vehicle_spaces = updates[
+                        parking_space.parking_spot_id
+                    ]
+                    parking_space.occupancy_percent = occupancy_percent
+                    parking_space.available_vehicle_spaces = available_vehicle_spaces
+                    histories.append(
+                        OccupancyHistory(
+                            user=request.user,
+                            parking_space=parking_space,
+                            updated_at=updated_at,
+                            occupancy_percent=occupancy_percent,
+                        )
+                    )
+                ParkingSpace.objects.bulk_update(
+                    parking_spaces, ["occupancy_percent", "available_vehicle_spaces"]
+                )
+                OccupancyHistory.objects.bulk_create(histories)
+                # * bulk writes skip the model signals
+                peak_times.record(histories)
+                coordinates = {(spot.lat, spot.lon) for spot in parking_spaces}
+                for lat, lon in coordinates:
+                    spot_changed(lat, lon)
+
+                watch_notifications = notifications.queue_watch_notifications(
+                    {
+                        parking_spot_id: occupancy_percent
+                        for parking_spot_id, (occupancy_percent, _) in updates.items()
+                    },
+                    get_current_site(request).domain,
+                    "https" if request.is_secure() else "http",
+                )
+            notifications.dispatch(watch_notifications)
 
-        email_message = EmailMultiAlternatives(subject, body, from_email, [to_email])
-        if html_email_template_name is not None:
-            html_email = loader.render_to_string(html_email_template_name, context)
-            email_message.attach_alternative(html_email, "text/html")
+            return Response(
+                {
+                    "message": "Occupancy percent updated successfully.",
+                    "updated": len(parking_spaces),
+                },
+                status=status.HTTP_200_OK,
+            )
 
-        email_message.send()
+        except Exception as e:
+            return Response(
+                {"message": f"An error occurred: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
 
 
 class ParkingSpacePostsAPIView(generics.ListAPIView):
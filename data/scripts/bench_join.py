@@ -0,0 +1,83 @@
+"""benchmark of preprocess_utils.join against the former nested loop join
+
+Run from data/scripts:
+    python bench_join.py -s 10000 100000 1000000
+"""
+import io
+import time
+import random
+import argparse
+from contextlib import redirect_stderr, redirect_stdout
+from typing import List, Dict
+
+from preprocess_utils import join
+from constant import PRIMARY_KEY_COLUMNS
+
+# * Initialize the Parser
+parser = argparse.ArgumentParser(description="Join benchmark config interface")
+
+# * Adding Arguments
+parser.add_argument(
+    "-s",
+    "--sizes",
+    type=int,
+    nargs="+",
+    default=[10_000, 100_000, 1_000_000],
+    help="Number of rows of each side of the join",
+)
+parser.add_argument(
+    "-m",
+    "--nested-max",
+    type=int,
+    default=5_000,
+    help="Largest size the nested loop join is timed at",
+)
+
+
+def nested_loop_join(
+    data1: List[Dict[str, str]], data2: List[Dict[str, str]], pks: List[str]
+) -> List[Dict[str, str]]:
+    """the O(n * m) join preprocess_utils.join used to be"""
+    result = []
+    for rowData1 in data1:
+        for rowData2 in data2:
+            if all(rowData1[pk] == rowData2[pk] for pk in pks):
+                result.append({**rowData1, **rowData2})
+    return result
+
+
+def make_rows(size: int, columns: List[str]) -> List[Dict[str, str]]:
+    """rows with about 60% of their keys shared with the other side"""
+    return [
+        {
+            PRIMARY_KEY_COLUMNS[0]: f"{random.randrange(int(size * 1.6)):07d}-DCA",
+            **{column: f"{column} {i}" for column in columns},
+        }
+        for i in range(size)
+    ]
+
+
+def timed(function, *args) -> tuple:
+    start = time.perf_counter()
+    # * silence the progress output of join
+    with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+        result = function(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    print(f"{'rows':>9} {'hash join (s)':>14} {'nested loop (s)':>16}")
+    for size in args.sizes:
+        data1 = make_rows(size, ["Business Name", "Address ZIP"])
+        data2 = make_rows(size, ["Business Name", "Latitude", "Longitude"])
+        result, hash_seconds = timed(join, data1, data2, PRIMARY_KEY_COLUMNS)
+
+        nested = "skipped"
+        if size <= args.nested_max:
+            expected, nested_seconds = timed(
+                nested_loop_join, data1, data2, PRIMARY_KEY_COLUMNS
+            )
+            assert result == expected
+            nested = f"{nested_seconds:.2f}"
+        print(f"{size:>9} {hash_seconds:>14.2f} {nested:>16}")
@@ -1,34 +1,19 @@
-import pandas as pd
-
-business_parking = pd.read_csv(
-    "../result.csv",
-    usecols=[
-        "DCA License Number",
-        "License Type",
-        "Business Name",
-        "Longitude",
-        "Latitude",
-        "Address ZIP",
-        "Address Borough",
-        "Detail",
-    ],
-)
-street_parking = pd.read_csv(
-    "../street_parking_list.csv",
-    usecols=[
-        "Meter Number",
-        "Facility",
-        "Longitude",
-        "Latitude",
-        "Zip Codes",
-        "Borough",
-        "Meter_Hours",
-    ],
-)
-
-business_parking["operation_hours"] = "unknown"
-street_parking["type"] = "Street"
-street_parking["parking_spot_name"] = ""
+import sys
+from typing import Dict, Iterable, Iterator
+
+from preprocess_utils import read_csv_rows, save_csv_file, save_npy_snapshot
+
+CONCAT_RESULT_COLUMNS = [
+    "parking_spot_id",
+    "type",
+    "parking_spot_name",
+    "address_zip",
+    "borough",
+    "detail",
+    "longitude",
+    "latitude",
+    "operation_hours",
+]
 
 business_col_name_mapping = {
     "DCA License Number": "parking_spot_id",
@@ -51,13 +36,62 @@ street_col_name_mapping = {
     "Facility": "detail",
 }
 
-business_parking.rename(columns=business_col_name_mapping, inplace=True)
-street_parking.rename(columns=street_col_name_mapping, inplace=True)
 
-concat_result = pd.concat(
-    [business_parking, street_parking], ignore_index=True, sort=False
-)
-# remove rows with no zip code
-concat_result = concat_result[concat_result["address_zip"].notnull()]
-concat_result["address_zip"] = concat_result["address_zip"].astype(int)
-concat_result.to_csv("../concat_result.csv", index=False)
+def _number(value: str) -> str:
+    """format a csv number the way the former pandas version wrote it"""
+    return repr(float(value)) if value else ""
+
+
+def rename_rows(
+    rows: Iterable[Dict[str, str]], mapping: Dict[str, str], defaults: Dict[str, str]
+) -> Iterator[Dict[str, str]]:
+    """stream rows with their columns renamed to the concat result ones
+
+    Rows without a zip code are dropped, the zip code is written as an
+    integer and the coordinates as floats.
+
+    Args:
+        rows (Iterable[Dict[str, str]]): rows of a source csv file
+        mapping (Dict[str, str]): source column name -> result column name
+        defaults (Dict[str, str]): value of the result columns with no source
+
+    Returns:
+        Iterator[Dict[str, str]]: rows with the CONCAT_RESULT_COLUMNS columns
+    """
+    for row in rows:
+        result = {**defaults}
+        for source, target in mapping.items():
+            result[target] = row[source]
+        if not result["address_zip"]:
+            continue
+        result["address_zip"] = str(int(float(result["address_zip"])))
+        result["longitude"] = _number(result["longitude"])
+        result["latitude"] = _number(result["latitude"])
+        yield {column: result[column] for column in CONCAT_RESULT_COLUMNS}
+
+
+def concat_rows() -> Iterator[Dict[str, str]]:
+    """business parking rows, then street parking rows, read one at a time"""
+    yield from rename_rows(
+        read_csv_rows("../result.csv"),
+        business_col_name_mapping,
+        {"operation_hours": "unknown"},
+    )
+    yield from rename_rows(
+        read_csv_rows("../street_parking_list.csv"),
+        street_col_name_mapping,
+        {"type": "Street", "parking_spot_name": ""},
+    )
+
+
+if __name__ == "__main__":
+    if not save_csv_file("../concat_result.csv", concat_rows()):
+        sys.exit(1)
+    # * typed columns of the same rows, a local artifact (not committed) that
+    # * `manage.py load_map_data --file=data/concat_result_snapshot` loads
+    # * without parsing the csv text
+    save_npy_snapshot(
+        "../concat_result_snapshot",
+        read_csv_rows("../concat_result.csv"),
+        floatColumns=["longitude", "latitude"],
+    )
@@ -1,13 +1,21 @@
 import os
-import csv
+import sys
 import argparse
+from typing import Dict, Iterator, List
 
 from preprocess_utils import (
-    join,
-    parse_data,
+    iter_join,
+    parse_frame,
+    frame_to_rows,
+    read_csv_frame,
+    read_csv_rows,
     save_csv_file,
-    filter_invalid_rows,
-    filter_license_expired_rows,
+    tee_csv_file,
+    iter_parsed_rows,
+    iter_valid_rows,
+    iter_unexpired_rows,
+    filter_invalid_frame,
+    filter_license_expired_frame,
 )
 from constant import (
     PRIMARY_KEY_COLUMNS,
@@ -42,52 +50,71 @@ parser.add_argument(
     default=True,
     help="Whether to save intermediate files",
 )
+parser.add_argument(
+    "-b",
+    "--backend",
+    type=str,
+    default="stream",
+    choices=["stream", "columnar"],
+    help="Process rows one at a time in bounded memory (stream), "
+    "or whole columns at once with pandas (columnar)",
+)
 
 args = parser.parse_args()
 SAVE_PATH = os.path.abspath(os.path.join(args.destination, args.name))
 
-print(">>> Processing...\n")
-
-
-print(f">>> Working on {PARKING_LIST_CSV_FILE_PATH1}")
-parkingListCSV1 = []
-with open(PARKING_LIST_CSV_FILE_PATH1, "r") as f:
-    parkingListCSV1 = list(csv.DictReader(f))
-    print(f">>> Finished reading CSV file at '{PARKING_LIST_CSV_FILE_PATH1}'")
-
-    parkingListCSV1 = filter_invalid_rows(parkingListCSV1, PARKING_LIST1_COLUMNS)
-    print(">>> Finished filtering invalid rows")
 
-    parkingListCSV1 = parse_data(parkingListCSV1, PARKING_LIST1_COLUMNS)
-    print(">>> Finished parsing data to corresponding type")
+def process(path: str, columns: List[tuple]) -> Iterator[Dict[str, str]]:
+    """valid, parsed and unexpired rows of a parking list
+
+    With the stream backend nothing is read until the rows are consumed,
+    one at a time. The columnar backend processes the whole list up front.
+
+    Args:
+        path (str): path of the parking list csv file
+        columns (List[tuple]): refer to .constant.PARKING_LIST_COLUMNS
+
+    Returns:
+        Iterator[Dict[str, str]]: processed rows
+    """
+    if args.backend == "columnar":
+        print(f">>> Working on {path}")
+        frame = read_csv_frame(path)
+        frame = filter_invalid_frame(frame, columns)
+        frame = parse_frame(frame, columns)
+        frame = filter_license_expired_frame(frame)
+        rows = iter(frame_to_rows(frame))
+    else:
+        print(f">>> Streaming {path}")
+        rows = read_csv_rows(path)
+        rows = iter_valid_rows(rows, columns)
+        rows = iter_parsed_rows(rows, columns)
+        rows = iter_unexpired_rows(rows)
+    if args.save:
+        rows = tee_csv_file(f"{path[:-4]}_processed.csv", rows)
+    return rows
 
-    parkingListCSV1 = filter_license_expired_rows(parkingListCSV1)
-    print(">>> Finished filtering out parking lots whose license has expired\n")
 
-if args.save:
-    save_csv_file(f"{PARKING_LIST_CSV_FILE_PATH1[:-4]}_processed.csv", parkingListCSV1)
-
-print(f">>> Working on {PARKING_LIST_CSV_FILE_PATH2}")
-parkingListCSV2 = []
-with open(PARKING_LIST_CSV_FILE_PATH2, "r") as f:
-    parkingListCSV2 = list(csv.DictReader(f))
-    print(f">>> Finished reading CSV file at '{PARKING_LIST_CSV_FILE_PATH2}'")
-
-    parkingListCSV2 = filter_invalid_rows(parkingListCSV2, PARKING_LIST2_COLUMNS)
-    print(">>> Finished filtering invalid rows")
-
-    parkingListCSV2 = parse_data(parkingListCSV2, PARKING_LIST2_COLUMNS)
-    print(">>> Finished parsing data to corresponding type")
-
-    parkingListCSV2 = filter_license_expired_rows(parkingListCSV2)
-    print(">>> Finished filtering out parking lots whose license has expired\n")
+print(">>> Processing...\n")
 
-if args.save:
-    save_csv_file(f"{PARKING_LIST_CSV_FILE_PATH2[:-4]}_processed.csv", parkingListCSV2)
+# * only the smaller list is held in memory, the other one is streamed
+# * through the join straight into the result file
+data2IsSmaller = os.path.getsize(PARKING_LIST_CSV_FILE_PATH2) <= os.path.getsize(
+    PARKING_LIST_CSV_FILE_PATH1
+)
+parkingListCSV1 = process(PARKING_LIST_CSV_FILE_PATH1, PARKING_LIST1_COLUMNS)
+parkingListCSV2 = process(PARKING_LIST_CSV_FILE_PATH2, PARKING_LIST2_COLUMNS)
+if data2IsSmaller:
+    streamed, materialized = parkingListCSV1, parkingListCSV2
+else:
+    streamed, materialized = parkingListCSV2, parkingListCSV1
 
 print(">>> Joining tables...\n")
-parkingList = join(parkingListCSV1, parkingListCSV2, PRIMARY_KEY_COLUMNS)
+parkingList = iter_join(
+    streamed, materialized, PRIMARY_KEY_COLUMNS, materializedIsData2=data2IsSmaller
+)
 
-save_csv_file(SAVE_PATH, parkingList)
+if not save_csv_file(SAVE_PATH, parkingList):
+    sys.exit(1)
 
 print(">>> Preprocess finished")
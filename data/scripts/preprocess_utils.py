@@ -1,8 +1,13 @@
 import csv
+import os
 
+import numpy as np
+import pandas as pd
+from collections import defaultdict
+from contextlib import contextmanager
 from tqdm import tqdm
 from datetime import datetime
-from typing import List, Dict, Callable
+from typing import IO, List, Dict, Callable, Iterable, Iterator
 
 
 def _partialDatetime(datetimePatternStr: str = "%m/%d/%Y") -> Callable[[str], str]:
@@ -14,7 +19,13 @@ def _partialDatetime(datetimePatternStr: str = "%m/%d/%Y") -> Callable[[str], st
     Returns:
         Callable[[str], str]: wrapped datetime.strptime
     """
-    return lambda datetimeStr: datetime.strptime(datetimeStr, datetimePatternStr).date()
+
+    def parse(datetimeStr: str) -> str:
+        return datetime.strptime(datetimeStr, datetimePatternStr).date()
+
+    # * lets parse_frame parse a whole column with the same pattern
+    parse.datetimePattern = datetimePatternStr
+    return parse
 
 
 def filter_invalid_rows(
@@ -101,6 +112,10 @@ def join(
 ) -> List[Dict[str, str]]:
     """join two data list, use the latter (data2) as the source of truth if conflict content encountered
 
+    data2 is indexed by primary key first (hash join), so the join is
+    O(n + m) instead of comparing every pair of rows. Rows come out in
+    data1 order, then data2 order for keys matching several data2 rows.
+
     Args:
         data1 (List[Dict[str, str]]): data list 1
         data2 (List[Dict[str, str]]): data list 2
@@ -109,46 +124,302 @@ def join(
     Returns:
         List[Dict[str, str]]: joined data list
     """
-    result = []
     print(f"> # of rows in data1 {len(data1)}\n> # of rows in data2 {len(data2)}")
+    # * primary key values -> data2 rows with that key
+    index = defaultdict(list)
+    for rowData2 in data2:
+        index[tuple(rowData2[pk] for pk in pks)].append(rowData2)
+
+    result = []
     for rowData1 in tqdm(data1):
-        for rowData2 in data2:
-            # * check all pk columns
-            isMatch = True
-            for pk in pks:
-                if rowData1[pk] == rowData2[pk]:
-                    continue
-                isMatch = False
-                break
-            if not isMatch:
-                continue
+        for rowData2 in index.get(tuple(rowData1[pk] for pk in pks), []):
+            # * data2 values overwrite data1 ones
+            result.append({**rowData1, **rowData2})
 
-            # * if all match, join the two rows
-            joinedRow = {}
-            for key1 in rowData1.keys():
-                joinedRow[key1] = rowData1[key1]
-            for key2 in rowData2.keys():
-                joinedRow[key2] = rowData2[key2]
+    print(f"> # of rows after joining with key '{', '.join(pks)}': {len(result)}")
+    return result
 
-            result.append(joinedRow)
 
-    print(f"> # of rows after joining with key '{pk}': {len(result)}")
-    return result
+def read_csv_rows(path: str) -> Iterator[Dict[str, str]]:
+    """stream the rows of a csv file
+
+    Args:
+        path (str): path of the csv file
+
+    Returns:
+        Iterator[Dict[str, str]]: rows, read one at a time
+    """
+    with open(path, "r") as f:
+        yield from csv.DictReader(f)
+
+
+def iter_valid_rows(
+    rows: Iterable[Dict[str, str]], columns: List[tuple]
+) -> Iterator[Dict[str, str]]:
+    """streaming filter_invalid_rows, keeps rows in their original order
+
+    Args:
+        rows (Iterable[Dict[str, str]]): rows to filter
+        columns (List[tuple]): refer to .constant.PARKING_LIST_COLUMNS
+
+    Returns:
+        Iterator[Dict[str, str]]: rows with every required column filled
+    """
+    required = [column["name"] for column in columns if column["required"]]
+    total = kept = 0
+    for row in rows:
+        total += 1
+        if all(row[name] for name in required):
+            kept += 1
+            yield row
+    print(f"> # of rows before filtering: {total}\n> # of rows after filtering: {kept}")
+
+
+def iter_parsed_rows(
+    rows: Iterable[Dict[str, str]], columns: List[tuple]
+) -> Iterator[Dict[str, str]]:
+    """streaming parse_data
+
+    Args:
+        rows (Iterable[Dict[str, str]]): rows to parse
+        columns (List[tuple]): refer to .constant.PARKING_LIST_COLUMNS
+
+    Returns:
+        Iterator[Dict[str, str]]: rows with each column parsed
+    """
+    for row in rows:
+        for column in columns:
+            row[column["name"]] = column["type"](row[column["name"]])
+        yield row
+
+
+def iter_unexpired_rows(
+    rows: Iterable[Dict[str, str]], column_name: str = "License Expiration Date"
+) -> Iterator[Dict[str, str]]:
+    """streaming filter_license_expired_rows, keeps rows in their original order"""
+    today = datetime.now().date()
+    total = kept = 0
+    for row in rows:
+        total += 1
+        if row[column_name] >= today:
+            kept += 1
+            yield row
+    print(f"> # of rows before filtering: {total}\n> # of rows after filtering: {kept}")
+
+
+def iter_join(
+    streamed: Iterable[Dict[str, str]],
+    materialized: Iterable[Dict[str, str]],
+    pks: List[str],
+    materializedIsData2: bool = True,
+) -> Iterator[Dict[str, str]]:
+    """streaming join, only the materialized side is held in memory
+
+    data2 stays the source of truth on conflicts whichever side it is.
+    Rows come out in the order of the streamed side, so the result is the
+    one of join when data2 is the materialized side.
+
+    Args:
+        streamed (Iterable[Dict[str, str]]): side read one row at a time
+        materialized (Iterable[Dict[str, str]]): side indexed in memory,
+        preferably the smaller one
+        pks (List[str]): names of the columns to use as primary keys
+        materializedIsData2 (bool): whether the materialized side is data2
+
+    Returns:
+        Iterator[Dict[str, str]]: joined rows
+    """
+    index = defaultdict(list)
+    for row in materialized:
+        index[tuple(row[pk] for pk in pks)].append(row)
+
+    joined = 0
+    for row in streamed:
+        for match in index.get(tuple(row[pk] for pk in pks), []):
+            joined += 1
+            yield {**row, **match} if materializedIsData2 else {**match, **row}
+    print(f"> # of rows after joining with key '{', '.join(pks)}': {joined}")
+
+
+@contextmanager
+def _atomic_write(savePath: str) -> Iterator[IO[str]]:
+    """open a temporary file next to savePath, moved in its place only
+    when the block completes, so a failure never leaves a truncated file"""
+    tmpPath = f"{savePath}.tmp"
+    try:
+        with open(tmpPath, "w") as f:
+            yield f
+        os.replace(tmpPath, savePath)
+    finally:
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
+
+
+def tee_csv_file(
+    savePath: str, rows: Iterable[Dict[str, str]]
+) -> Iterator[Dict[str, str]]:
+    """pass rows through while also writing them to a csv file, the file is
+    only written once every row went through"""
+    with _atomic_write(savePath) as f:
+        writer = None
+        for row in rows:
+            if writer is None:
+                writer = csv.DictWriter(f, list(row.keys()))
+                writer.writeheader()
+            writer.writerow(row)
+            yield row
 
 
-def save_csv_file(savePath: str, csvContent: List[Dict[str, str]]) -> bool:
+def read_csv_frame(path: str) -> pd.DataFrame:
+    """read a csv file into a frame of strings, empty cells included, the
+    way csv.DictReader sees it
+
+    Args:
+        path (str): path of the csv file
+
+    Returns:
+        pd.DataFrame: one string column per csv column
+    """
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+
+def filter_invalid_frame(frame: pd.DataFrame, columns: List[tuple]) -> pd.DataFrame:
+    """columnar filter_invalid_rows, keeps rows in their original order
+
+    Args:
+        frame (pd.DataFrame): data read by read_csv_frame
+        columns (List[tuple]): refer to .constant.PARKING_LIST_COLUMNS
+
+    Returns:
+        pd.DataFrame: rows with every required column filled
+    """
+    required = [column["name"] for column in columns if column["required"]]
+    valid = (frame[required] != "").all(axis=1)
+    print(
+        f"> # of rows before filtering: {len(frame)}\n> # of rows after filtering: {valid.sum()}"
+    )
+    return frame[valid]
+
+
+def parse_frame(frame: pd.DataFrame, columns: List[tuple]) -> pd.DataFrame:
+    """columnar parse_data, each column is parsed at once
+
+    Dates are parsed with the pattern of their _partialDatetime parser,
+    each distinct value only once, other types are cast column-wise.
+
+    Args:
+        frame (pd.DataFrame): data read by read_csv_frame
+        columns (List[tuple]): refer to .constant.PARKING_LIST_COLUMNS
+
+    Returns:
+        pd.DataFrame: frame with each column parsed
+    """
+    frame = frame.copy()
+    for column in columns:
+        name, parser = column["name"], column["type"]
+        if parser is str:
+            continue
+        if hasattr(parser, "datetimePattern"):
+            if (frame[name] == "").any():
+                # * same failure as datetime.strptime on an empty cell
+                raise ValueError(f"empty date in column '{name}'")
+            parsed = pd.to_datetime(
+                frame[name], format=parser.datetimePattern, cache=True
+            )
+            frame[name] = pd.Series(parsed.dt.date, index=frame.index, dtype=object)
+        else:
+            frame[name] = frame[name].astype(parser)
+    return frame
+
+
+def filter_license_expired_frame(
+    frame: pd.DataFrame, column_name: str = "License Expiration Date"
+) -> pd.DataFrame:
+    """columnar filter_license_expired_rows, keeps rows in their original order"""
+    unexpired = frame[column_name] >= datetime.now().date()
+    print(
+        f"> # of rows before filtering: {len(frame)}\n> # of rows after filtering: {unexpired.sum()}"
+    )
+    return frame[unexpired]
+
+
+def frame_to_rows(frame: pd.DataFrame) -> List[Dict[str, str]]:
+    """rows of a frame as the dictionaries of the row-wise functions"""
+    return frame.to_dict("records")
+
+
+def save_csv_file(savePath: str, csvContent: Iterable[Dict[str, str]]) -> bool:
+    """save rows to a csv file
+
+    Streamed content is processed while it is written, the file is only
+    put in place once every row was written. Errors are printed and
+    raised again, the previous file is then left untouched.
+
+    Args:
+        savePath (str): path of the csv file
+        csvContent (Iterable[Dict[str, str]]): rows, read one at a time
+
+    Returns:
+        bool: whether the file was saved, False when there is no row
+    """
     print(f">>> Saving file to {savePath}\n")
+    rows = iter(csvContent)
     try:
-        with open(savePath, "w") as f:
+        firstRow = next(rows, None)
+        if firstRow is None:
+            print("no rows to save")
+            return False
+        with _atomic_write(savePath) as f:
             # * creating a csv dict writer object
-            writer = csv.DictWriter(f, list(csvContent[0].keys()))
+            writer = csv.DictWriter(f, list(firstRow.keys()))
 
             # * writing headers (field names)
             writer.writeheader()
 
-            # * writing data rows
-            writer.writerows(csvContent)
+            # * writing data rows, one at a time for streamed content
+            writer.writerow(firstRow)
+            writer.writerows(rows)
         return True
     except Exception as e:
         print(e)
+        raise
+
+
+def save_npy_snapshot(
+    savePath: str, csvContent: Iterable[Dict[str, str]], floatColumns: List[str]
+) -> bool:
+    """save the data as a folder of typed .npy columns, one file per column
+
+    Float columns are stored as float64, NaN for empty cells, and every
+    other column as a fixed width unicode array, so that readers can
+    memory map them (numpy.load(..., mmap_mode="r")) instead of parsing
+    the csv text.
+
+    Args:
+        savePath (str): folder to save the columns in
+        csvContent (Iterable[Dict[str, str]]): rows, read one at a time
+        floatColumns (List[str]): names of the columns holding numbers
+
+    Returns:
+        bool: whether the snapshot was saved
+    """
+    print(f">>> Saving snapshot to {savePath}\n")
+    columns = defaultdict(list)
+    for row in csvContent:
+        for name, value in row.items():
+            columns[name].append(value)
+    if not columns:
+        print("no rows to save")
         return False
+
+    os.makedirs(savePath, exist_ok=True)
+    for name, values in columns.items():
+        if name in floatColumns:
+            array = np.array(
+                [float(value) if value else np.nan for value in values],
+                dtype=np.float64,
+            )
+        else:
+            array = np.array(values, dtype=str)
+        np.save(os.path.join(savePath, f"{name}.npy"), array)
+    return True
@@ -12,6 +12,9 @@ class ParkingSpaceAdmin(admin.ModelAdmin):
     # * must contact the Admin to connect a Parking Space
     # * with the owner's username
     search_fields = ["parking_spot_id"]
+    # * retired spots are listed too, clearing retired_at restores them
+    list_display = ["parking_spot_id", "parking_spot_name", "type", "retired_at"]
+    list_filter = [("retired_at", admin.EmptyFieldListFilter)]
 
 
 class OccupancyHistoryAdmin(admin.ModelAdmin):
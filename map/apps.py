@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class MapConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "map"
+
+    def ready(self):
+        from . import signals  # noqa: F401
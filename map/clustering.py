@@ -0,0 +1,185 @@
+"""grid clustering of parking spots for zoomed out map views
+
+The world is cut into square lat/lon tiles of 360 / 2^zoom degrees, each
+tile into CELLS_PER_TILE x CELLS_PER_TILE cells. Every cell holding spots
+becomes one cluster, so a tile never yields more than CELLS_PER_TILE^2
+clusters whatever the number of spots. Clusters are computed by a single
+GROUP BY over the missing tiles and cached per (zoom, tile). The tiles
+of a changed spot are dropped from the cache right away and once the
+write commits.
+"""
+import math
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Floor
+
+from .models import ParkingSpace
+
+CELLS_PER_TILE = 8
+MAX_ZOOM = 22
+# * upper bound of tiles per request, keeps the response size bounded
+MAX_TILES = 64
+CACHE_KEY_PREFIX = "map:clusters"
+
+Tile = Tuple[int, int]
+
+
+def tile_size(zoom: int) -> float:
+    """width (and height) of a tile in degrees"""
+    return 360 / 2**zoom
+
+
+def _tile_ranges(
+    south: float, west: float, north: float, east: float, zoom: int
+) -> Tuple[range, range]:
+    """x and y ranges of the tiles intersecting the lat/lon box, the bounds
+    must be finite"""
+    size = tile_size(zoom)
+    xs = range(math.floor(west / size), math.floor(east / size) + 1)
+    ys = range(math.floor(south / size), math.floor(north / size) + 1)
+    return xs, ys
+
+
+def count_tiles_covering(
+    south: float, west: float, north: float, east: float, zoom: int
+) -> int:
+    """number of tiles tiles_covering would return, without building them"""
+    xs, ys = _tile_ranges(south, west, north, east, zoom)
+    return len(xs) * len(ys)
+
+
+def tiles_covering(
+    south: float, west: float, north: float, east: float, zoom: int
+) -> List[Tile]:
+    """(x, y) of every tile intersecting the lat/lon box
+
+    NOTE: the list grows with the box area times 4^zoom, callers taking
+    the box from a request should bound count_tiles_covering first
+    """
+    xs, ys = _tile_ranges(south, west, north, east, zoom)
+    return [(x, y) for x in xs for y in ys]
+
+
+def cache_key(zoom: int, tile: Tile) -> str:
+    return f"{CACHE_KEY_PREFIX}:{zoom}:{tile[0]}:{tile[1]}"
+
+
+def compute_clusters(tiles: List[Tile], zoom: int) -> Dict[Tile, List[dict]]:
+    """cluster the spots of the given tiles
+
+    Args:
+        tiles (List[Tile]): tiles to compute, all at the same zoom
+        zoom (int): zoom level
+
+    Returns:
+        Dict[Tile, List[dict]]: clusters of each tile, an empty list for
+        tiles without spots
+    """
+    clusters = {tile: [] for tile in tiles}
+    if not tiles:
+        return clusters
+
+    size = tile_size(zoom)
+    cell_size = size / CELLS_PER_TILE
+    xs = [x for x, _ in tiles]
+    ys = [y for _, y in tiles]
+    rows = (
+        ParkingSpace.objects.filter(
+            lat__gte=min(ys) * size,
+            lat__lt=(max(ys) + 1) * size,
+            lon__gte=min(xs) * size,
+            lon__lt=(max(xs) + 1) * size,
+        )
+        .annotate(
+            cell_x=Floor(F("lon") / cell_size),
+            cell_y=Floor(F("lat") / cell_size),
+        )
+        .values("cell_x", "cell_y", "type")
+        .annotate(
+            count=Count("parking_spot_id"),
+            lat_sum=Sum("lat"),
+            lon_sum=Sum("lon"),
+            occupancy_sum=Sum("occupancy_percent"),
+            occupancy_count=Count("occupancy_percent"),
+        )
+    )
+
+    # * merge the per type rows of each cell
+    cells = defaultdict(
+        lambda: {
+            "count": 0,
+            "lat_sum": 0.0,
+            "lon_sum": 0.0,
+            "occupancy_sum": 0,
+            "occupancy_count": 0,
+            "types": {},
+        }
+    )
+    for row in rows:
+        cell = cells[(int(row["cell_x"]), int(row["cell_y"]))]
+        cell["count"] += row["count"]
+        cell["lat_sum"] += row["lat_sum"]
+        cell["lon_sum"] += row["lon_sum"]
+        cell["occupancy_sum"] += row["occupancy_sum"] or 0
+        cell["occupancy_count"] += row["occupancy_count"]
+        cell["types"][row["type"]] = row["count"]
+
+    for (cell_x, cell_y), cell in cells.items():
+        tile = (cell_x // CELLS_PER_TILE, cell_y // CELLS_PER_TILE)
+        if tile not in clusters:
+            # * the query box also covers tiles that were already cached
+            continue
+        clusters[tile].append(
+            {
+                "latitude": cell["lat_sum"] / cell["count"],
+                "longitude": cell["lon_sum"] / cell["count"],
+                "count": cell["count"],
+                "mean_occupancy_percent": (
+                    cell["occupancy_sum"] / cell["occupancy_count"]
+                    if cell["occupancy_count"]
+                    else None
+                ),
+                "types": cell["types"],
+            }
+        )
+    return clusters
+
+
+def get_clusters(tiles: List[Tile], zoom: int) -> List[dict]:
+    """clusters of the given tiles, served from the cache when possible"""
+    keys = {cache_key(zoom, tile): tile for tile in tiles}
+    cached = cache.get_many(keys.keys())
+    missing = [tile for key, tile in keys.items() if key not in cached]
+
+    computed = compute_clusters(missing, zoom)
+    cache.set_many(
+        {
+            cache_key(zoom, tile): tile_clusters
+            for tile, tile_clusters in computed.items()
+        },
+        timeout=settings.PARKING_SPOT_CLUSTER_CACHE_TIMEOUT,
+    )
+
+    result = []
+    for key, tile in keys.items():
+        result.extend(cached[key] if key in cached else computed[tile])
+    return result
+
+
+def invalidate_spot(lat, lon) -> None:
+    """drop the cached clusters of every zoom level containing (lat, lon),
+    right away and again once the transaction commits, so clusters computed
+    from the old rows before the commit do not stay cached"""
+    if lat is None or lon is None:
+        return
+    keys = [
+        cache_key(zoom, tiles_covering(lat, lon, lat, lon, zoom)[0])
+        for zoom in range(MAX_ZOOM + 1)
+    ]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,139 @@
+"""hourly occupancy forecasts of the parking spots
+
+The expected occupancy of a spot at a given weekday and hour is the mean
+occupancy reported for that cell, shrunk towards the spot's mean for that
+hour over every weekday, itself shrunk towards the spot's overall mean.
+Sparse cells then fall back on the hour, and sparse hours on the spot,
+with PRIOR_WEIGHT acting as a number of virtual reports.
+
+Forecasts of every spot are computed at once on (spots, 7, 24) arrays
+and stored in OccupancyForecast, see the precompute_forecasts command,
+so serving one is a primary key lookup.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OccupancyForecast, OccupancyHourlyCount
+
+PRIOR_WEIGHT = 3.0
+HOURS_PER_WEEK = 7 * 24
+BATCH_SIZE = 1000
+
+
+def expected_occupancy(sums: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """expected occupancy of every (spot, weekday, hour) cell
+
+    Args:
+        sums (np.ndarray): (spots, 7, 24) sums of the reported percents
+        counts (np.ndarray): (spots, 7, 24) numbers of reported percents
+
+    Returns:
+        np.ndarray: (spots, 7, 24) expected percents, nan for spots
+        without any report
+    """
+    with np.errstate(invalid="ignore", divide="ignore"):
+        overall = sums.sum(axis=(1, 2)) / counts.sum(axis=(1, 2))
+        hourly = (sums.sum(axis=1) + PRIOR_WEIGHT * overall[:, None]) / (
+            counts.sum(axis=1) + PRIOR_WEIGHT
+        )
+        return (sums + PRIOR_WEIGHT * hourly[:, None, :]) / (counts + PRIOR_WEIGHT)
+
+
+def precompute() -> int:
+    """recompute the stored forecast of every spot with occupancy reports
+
+    Returns:
+        int: number of forecasts written
+    """
+    rows = list(
+        OccupancyHourlyCount.objects.filter(occupancy_count__gt=0).values_list(
+            "parking_space_id", "weekday", "hour", "occupancy_sum", "occupancy_count"
+        )
+    )
+    spot_ids = sorted({row[0] for row in rows})
+    positions = {spot_id: position for position, spot_id in enumerate(spot_ids)}
+    sums = np.zeros((len(spot_ids), 7, 24))
+    counts = np.zeros((len(spot_ids), 7, 24))
+    if rows:
+        spots, weekdays, hours, cell_sums, cell_counts = zip(*rows)
+        cells = ([positions[spot_id] for spot_id in spots], weekdays, hours)
+        sums[cells] = cell_sums
+        counts[cells] = cell_counts
+
+    expected = np.round(expected_occupancy(sums, counts), 1).reshape(
+        len(spot_ids), HOURS_PER_WEEK
+    )
+    computed_at = timezone.now()
+    with transaction.atomic():
+        OccupancyForecast.objects.all().delete()
+        OccupancyForecast.objects.bulk_create(
+            (
+                OccupancyForecast(
+                    parking_space_id=spot_id,
+                    expected_occupancy=[
+                        None if np.isnan(percent) else percent
+                        for percent in expected[position].tolist()
+                    ],
+                    computed_at=computed_at,
+                )
+                for spot_id, position in positions.items()
+            ),
+            batch_size=BATCH_SIZE,
+        )
+    return len(spot_ids)
+
+
+def next_hours(
+    expected: List[Optional[float]], start: datetime, hours: int = 24
+) -> List[Optional[float]]:
+    """expected occupancy of the hours following start, start's hour first
+
+    Args:
+        expected (List[Optional[float]]): stored weekly forecast of a spot
+        start (datetime): first hour of the forecast
+        hours (int): number of hours
+
+    Returns:
+        List[Optional[float]]: expected percent of each hour
+    """
+    if timezone.is_aware(start):
+        start = timezone.localtime(start)
+    first = start.weekday() * 24 + start.hour
+    return [expected[(first + offset) % HOURS_PER_WEEK] for offset in range(hours)]
+
+
+def forecast_start() -> datetime:
+    """start of the current hour"""
+    return timezone.now().replace(minute=0, second=0, microsecond=0)
+
+
+def forecasts_for(parking_spot_ids, hours: int = 24) -> Dict[str, dict]:
+    """hourly forecasts of the given spots from the current hour on
+
+    Args:
+        parking_spot_ids: ids of the spots, those without a forecast are left out
+        hours (int): number of hours
+
+    Returns:
+        Dict[str, dict]: {"computed_at": ..., "hours": [...]} per spot id
+    """
+    start = forecast_start()
+    times = [start + timedelta(hours=offset) for offset in range(hours)]
+    return {
+        forecast.parking_space_id: {
+            "computed_at": forecast.computed_at,
+            "hours": [
+                {"time": time, "expected_occupancy_percent": percent}
+                for time, percent in zip(
+                    times, next_hours(forecast.expected_occupancy, start, hours)
+                )
+            ],
+        }
+        for forecast in OccupancyForecast.objects.filter(
+            parking_space_id__in=parking_spot_ids
+        )
+    }
@@ -0,0 +1,43 @@
+"""geo helpers shared by the parking space lookups
+"""
+import math
+from typing import Optional, Tuple
+
+# * mean earth radius, the same value haversine uses for Unit.MILES
+EARTH_RADIUS_MILES = 3958.7613
+MILES_PER_DEGREE_LAT = EARTH_RADIUS_MILES * math.pi / 180
+
+
+def to_float(value) -> Optional[float]:
+    """parse a coordinate stored as text, None if it is not a number
+
+    Args:
+        value: raw coordinate value (str, float, None...)
+
+    Returns:
+        Optional[float]: parsed coordinate or None
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def bounding_box(
+    center: Tuple[float, float], radius_miles: float
+) -> Tuple[float, float, float, float]:
+    """smallest lat/lon box containing the circle of radius_miles around center
+
+    Args:
+        center (Tuple[float, float]): (lat, lon) of the circle center
+        radius_miles (float): circle radius in miles
+
+    Returns:
+        Tuple[float, float, float, float]: (south, west, north, east)
+    """
+    lat, lon = center
+    lat_delta = radius_miles / MILES_PER_DEGREE_LAT
+    # * longitude degrees shrink towards the poles, widen the box accordingly
+    cos_lat = math.cos(math.radians(min(abs(lat) + lat_delta, 89.9)))
+    lon_delta = min(lat_delta / cos_lat, 180.0)
+    return lat - lat_delta, lon - lon_delta, lat + lat_delta, lon + lon_delta
@@ -0,0 +1,214 @@
+"""bulk loading of the preprocessed parking spot dataset
+
+Shared by the load_map_data command and the load_parking_lot_data
+script. Rows are streamed from the CSV, or from its typed snapshot (see
+map/snapshot.py), and written in chunks with one bulk statement each,
+instead of one autocommitted INSERT per row, so a load is idempotent and
+scales with the dataset.
+
+Every loaded spot stores a hash of its dataset columns. sync_spots uses
+it to refresh the table from a new export while only writing the rows
+that changed: new spots are inserted, changed ones updated, and dataset
+spots missing from the export (and not claimed by an owner) retired.
+"""
+import csv
+import hashlib
+from itertools import islice
+from typing import Iterable, Iterator, List, NamedTuple, Set
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import snapshot, spatial, tile_cache
+from .geo import to_float
+from .models import ParkingSpace
+
+CHUNK_SIZE = 2000
+# * CSV columns, all of them ParkingSpace fields
+FIELDS = [
+    "parking_spot_id",
+    "type",
+    "parking_spot_name",
+    "address_zip",
+    "borough",
+    "detail",
+    "longitude",
+    "latitude",
+    "operation_hours",
+]
+# * fields written when a dataset row replaces a stored spot
+UPDATE_FIELDS = [*FIELDS[1:], "lat", "lon", "content_hash", "retired_at"]
+
+
+class LoadCounts(NamedTuple):
+    inserted: int = 0
+    updated: int = 0
+    skipped: int = 0
+    retired: int = 0
+
+    def __add__(self, other):
+        return LoadCounts(*(a + b for a, b in zip(self, other)))
+
+
+def read_rows(path: str) -> Iterator[dict]:
+    """stream the rows of a preprocessed CSV file, or of its snapshot
+    folder (see map/snapshot.py)"""
+    if snapshot.exists(path):
+        yield from snapshot.read_rows(path, FIELDS)
+        return
+    with open(path, "r") as file:
+        yield from csv.DictReader(file)
+
+
+def chunked(rows: Iterable, size: int) -> Iterator[List]:
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def content_hash(row: dict) -> str:
+    return hashlib.sha256(
+        "\x1f".join(row[field] for field in FIELDS).encode()
+    ).hexdigest()
+
+
+def build_spot(row: dict) -> ParkingSpace:
+    """ParkingSpace of a CSV row, with the lat / lon columns save() would set"""
+    spot = ParkingSpace(**{field: row[field] for field in FIELDS})
+    spot.lat = to_float(spot.latitude)
+    spot.lon = to_float(spot.longitude)
+    spot.content_hash = content_hash(row)
+    return spot
+
+
+def _unique_spots(rows: List[dict], seen: Set[str]):
+    """spots of the rows not seen before, and the number of rows skipped"""
+    spots = {}
+    skipped = 0
+    for row in rows:
+        spot_id = row.get("parking_spot_id")
+        if not spot_id or spot_id in spots or spot_id in seen:
+            skipped += 1
+            continue
+        spots[spot_id] = build_spot(row)
+    seen.update(spots)
+    return spots, skipped
+
+
+def _load_chunk(rows: List[dict], update: bool, seen: Set[str]) -> LoadCounts:
+    spots, skipped = _unique_spots(rows, seen)
+    existing = set(
+        ParkingSpace.all_objects.filter(parking_spot_id__in=spots).values_list(
+            "parking_spot_id", flat=True
+        )
+    )
+    if update:
+        ParkingSpace.all_objects.bulk_create(
+            spots.values(),
+            update_conflicts=True,
+            unique_fields=["parking_spot_id"],
+            update_fields=UPDATE_FIELDS,
+        )
+        return LoadCounts(len(spots) - len(existing), len(existing), skipped)
+
+    ParkingSpace.all_objects.bulk_create(
+        [spot for spot_id, spot in spots.items() if spot_id not in existing],
+        ignore_conflicts=True,
+    )
+    return LoadCounts(len(spots) - len(existing), 0, skipped + len(existing))
+
+
+def _sync_chunk(rows: List[dict], seen: Set[str]) -> LoadCounts:
+    spots, skipped = _unique_spots(rows, seen)
+    stored = {
+        spot_id: (stored_hash, retired_at)
+        for spot_id, stored_hash, retired_at in ParkingSpace.all_objects.filter(
+            parking_spot_id__in=spots
+        ).values_list("parking_spot_id", "content_hash", "retired_at")
+    }
+    new = [spot for spot_id, spot in spots.items() if spot_id not in stored]
+    changed = [
+        spot
+        for spot_id, spot in spots.items()
+        if spot_id in stored and stored[spot_id] != (spot.content_hash, None)
+    ]
+    ParkingSpace.all_objects.bulk_create(new, ignore_conflicts=True)
+    ParkingSpace.all_objects.bulk_update(changed, UPDATE_FIELDS)
+    unchanged = len(spots) - len(new) - len(changed)
+    return LoadCounts(len(new), len(changed), skipped + unchanged)
+
+
+def _retire_missing(seen: Set[str], chunk_size: int) -> int:
+    """retire the active dataset spots that are not in seen
+
+    Spots added on the site always have an owner, so every spot without
+    one comes from the dataset, including those loaded before content
+    hashes were stored.
+    """
+    missing = [
+        spot_id
+        for spot_id in ParkingSpace.objects.filter(user__isnull=True)
+        .values_list("parking_spot_id", flat=True)
+        .iterator(chunk_size=chunk_size)
+        if spot_id not in seen
+    ]
+    retired_at = timezone.now()
+    for chunk in chunked(missing, chunk_size):
+        ParkingSpace.objects.filter(parking_spot_id__in=chunk).update(
+            retired_at=retired_at
+        )
+    return len(missing)
+
+
+def load_spots(
+    rows: Iterable[dict], update: bool = False, chunk_size: int = CHUNK_SIZE
+) -> LoadCounts:
+    """insert the spots of the rows, in chunks
+
+    Args:
+        rows (Iterable[dict]): CSV rows with the FIELDS columns
+        update (bool): overwrite the FIELDS of spots that already exist,
+        they are skipped otherwise
+        chunk_size (int): rows written per statement
+
+    Returns:
+        LoadCounts: number of spots inserted, updated and skipped
+    """
+    counts = LoadCounts()
+    seen = set()
+    for chunk in chunked(rows, chunk_size):
+        with transaction.atomic():
+            counts += _load_chunk(chunk, update, seen)
+    _spots_changed(counts)
+    return counts
+
+
+def sync_spots(rows: Iterable[dict], chunk_size: int = CHUNK_SIZE) -> LoadCounts:
+    """make the stored dataset spots match the rows, writing changes only
+
+    Args:
+        rows (Iterable[dict]): CSV rows of the complete dataset
+        chunk_size (int): rows compared and written per statement
+
+    Returns:
+        LoadCounts: number of spots inserted, updated, unchanged (skipped)
+        and retired
+    """
+    counts = LoadCounts()
+    seen = set()
+    for chunk in chunked(rows, chunk_size):
+        with transaction.atomic():
+            counts += _sync_chunk(chunk, seen)
+    counts += LoadCounts(retired=_retire_missing(seen, chunk_size))
+    _spots_changed(counts)
+    return counts
+
+
+def _spots_changed(counts: LoadCounts) -> None:
+    if counts.inserted or counts.updated or counts.retired:
+        # * bulk writes skip the ParkingSpace signals
+        spatial.bump_version()
+        tile_cache.invalidate_all()
@@ -1,11 +1,9 @@
 import os
-import csv
 from tqdm import tqdm
 from pathlib import Path
-from django.db.utils import IntegrityError
 from django.core.management.base import BaseCommand
 
-from map.models import ParkingSpace
+from map import loader
 
 BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent
 csv_file_path = os.path.join(BASE_DIR, "data/concat_result.csv")
@@ -14,26 +12,47 @@ csv_file_path = os.path.join(BASE_DIR, "data/concat_result.csv")
 class Command(BaseCommand):
     """load latest data and merge into database"""
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--file",
+            default=csv_file_path,
+            help="Preprocessed CSV file, or its snapshot folder written by "
+            "data/scripts/concat_files.py, to load",
+        )
+        mode = parser.add_mutually_exclusive_group()
+        mode.add_argument(
+            "--update",
+            action="store_true",
+            help="Overwrite the attributes of spots that already exist",
+        )
+        mode.add_argument(
+            "--sync",
+            action="store_true",
+            help="Only write changed rows and retire spots missing from the file",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=loader.CHUNK_SIZE,
+            help="Rows written per statement",
+        )
+
     def handle(self, *args, **options):
-        print(f"csv file path is: {csv_file_path}")
-
-        count = 0
-        with open(csv_file_path, "r") as file:
-            reader = csv.DictReader(file)
-            for row in tqdm(reader):
-                try:
-                    ParkingSpace.objects.create(
-                        type=row["type"],
-                        detail=row["detail"],
-                        borough=row["borough"],
-                        latitude=row["latitude"],
-                        longitude=row["longitude"],
-                        address_zip=row["address_zip"],
-                        operation_hours=row["operation_hours"],
-                        parking_spot_id=row["parking_spot_id"],
-                        parking_spot_name=row["parking_spot_name"],
-                    )
-                    count += 1
-                except IntegrityError:
-                    print(f"Skipping Parking Space Record[{row['parking_spot_id']}]")
-        print(f"{count} records added!")
+        print(f"csv file path is: {options['file']}")
+
+        rows = tqdm(loader.read_rows(options["file"]))
+        if options["sync"]:
+            counts = loader.sync_spots(rows, chunk_size=options["chunk_size"])
+            print(
+                f"{counts.inserted} records added, {counts.updated} updated, "
+                f"{counts.skipped} unchanged, {counts.retired} retired!"
+            )
+            return
+
+        counts = loader.load_spots(
+            rows, update=options["update"], chunk_size=options["chunk_size"]
+        )
+        print(
+            f"{counts.inserted} records added, {counts.updated} updated, "
+            f"{counts.skipped} skipped!"
+        )
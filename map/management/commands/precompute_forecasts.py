@@ -0,0 +1,14 @@
+"""occupancy forecast manage.py script
+"""
+from django.core.management.base import BaseCommand
+
+from map import forecasts
+
+
+class Command(BaseCommand):
+    """recompute the hourly occupancy forecast of every spot, meant to run
+    nightly"""
+
+    def handle(self, *args, **options):
+        count = forecasts.precompute()
+        self.stdout.write(f"{count} forecasts written")
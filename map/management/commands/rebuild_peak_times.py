@@ -0,0 +1,13 @@
+"""rebuild the hourly occupancy counts manage.py script
+"""
+from django.core.management.base import BaseCommand
+
+from map import peak_times
+
+
+class Command(BaseCommand):
+    """recompute the per spot weekday / hour report counts from the history"""
+
+    def handle(self, *args, **options):
+        cells = peak_times.rebuild()
+        self.stdout.write(f"{cells} hourly counts written")
@@ -0,0 +1,40 @@
+"""occupancy history rollup manage.py script
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from map import rollups
+
+
+class Command(BaseCommand):
+    """fold the occupancy history older than the retention period into
+    15 or 60 minute aggregates, meant to run periodically"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            default=settings.OCCUPANCY_HISTORY_RETENTION_DAYS,
+            help="Days of raw history to keep",
+        )
+        parser.add_argument(
+            "--bucket-minutes",
+            type=int,
+            choices=rollups.BUCKET_MINUTES,
+            default=settings.OCCUPANCY_ROLLUP_BUCKET_MINUTES,
+            help="Length of the aggregated time buckets",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=rollups.BATCH_SIZE,
+            help="History rows folded per transaction",
+        )
+
+    def handle(self, *args, **options):
+        rolled_up = rollups.roll_up(
+            options["retention_days"],
+            options["bucket_minutes"],
+            options["batch_size"],
+        )
+        self.stdout.write(f"{rolled_up} history rows rolled up")
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.6 on 2026-10-18 06:04
+
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def fill_lat_lon(apps, schema_editor):
+    ParkingSpace = apps.get_model("map", "ParkingSpace")
+    batch = []
+    for spot in ParkingSpace.objects.only("latitude", "longitude").iterator(
+        chunk_size=BATCH_SIZE
+    ):
+        spot.lat = to_float(spot.latitude)
+        spot.lon = to_float(spot.longitude)
+        batch.append(spot)
+        if len(batch) >= BATCH_SIZE:
+            ParkingSpace.objects.bulk_update(batch, ["lat", "lon"])
+            batch = []
+    if batch:
+        ParkingSpace.objects.bulk_update(batch, ["lat", "lon"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("map", "0009_parkingspace_available_vehicle_spaces"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="parkingspace",
+            name="lat",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="parkingspace",
+            name="lon",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="parkingspace",
+            index=models.Index(fields=["lat", "lon"], name="parkingspace_lat_lon_idx"),
+        ),
+        migrations.RunPython(fill_lat_lon, migrations.RunPython.noop),
+    ]
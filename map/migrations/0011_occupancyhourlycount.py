@@ -0,0 +1,45 @@
+# Generated by Django 4.2.6 on 2026-10-18 06:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("map", "0010_parkingspace_lat_lon"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OccupancyHourlyCount",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("weekday", models.PositiveSmallIntegerField()),
+                ("hour", models.PositiveSmallIntegerField()),
+                ("count", models.PositiveIntegerField(default=0)),
+                (
+                    "parking_space",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="hourly_counts",
+                        to="map.parkingspace",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="occupancyhourlycount",
+            constraint=models.UniqueConstraint(
+                fields=("parking_space", "weekday", "hour"),
+                name="occupancyhourlycount_unique_cell",
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.6 on 2026-10-18 06:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("map", "0011_occupancyhourlycount"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="occupancyhistory",
+            index=models.Index(
+                fields=["parking_space", "updated_at"],
+                name="occupancyhistory_spot_time_idx",
+            ),
+        ),
+    ]
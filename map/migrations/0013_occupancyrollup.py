@@ -0,0 +1,49 @@
+# Generated by Django 4.2.6 on 2026-10-18 06:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("map", "0012_occupancyhistory_spot_time_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OccupancyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("bucket_start", models.DateTimeField()),
+                ("bucket_minutes", models.PositiveSmallIntegerField()),
+                ("report_count", models.PositiveIntegerField(default=0)),
+                ("occupancy_count", models.PositiveIntegerField(default=0)),
+                ("occupancy_sum", models.IntegerField(default=0)),
+                ("min_occupancy_percent", models.IntegerField(blank=True, null=True)),
+                ("max_occupancy_percent", models.IntegerField(blank=True, null=True)),
+                (
+                    "parking_space",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="occupancy_rollups",
+                        to="map.parkingspace",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="occupancyrollup",
+            constraint=models.UniqueConstraint(
+                fields=("parking_space", "bucket_minutes", "bucket_start"),
+                name="occupancyrollup_unique_bucket",
+            ),
+        ),
+    ]
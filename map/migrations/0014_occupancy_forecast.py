@@ -0,0 +1,44 @@
+# Generated by Django 4.2.6 on 2026-10-18 06:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("map", "0013_occupancyrollup"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OccupancyForecast",
+            fields=[
+                (
+                    "parking_space",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="forecast",
+                        serialize=False,
+                        to="map.parkingspace",
+                    ),
+                ),
+                ("expected_occupancy", models.JSONField()),
+                (
+                    "computed_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="occupancyhourlycount",
+            name="occupancy_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="occupancyhourlycount",
+            name="occupancy_sum",
+            field=models.IntegerField(default=0),
+        ),
+    ]
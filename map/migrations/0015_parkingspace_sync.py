@@ -0,0 +1,22 @@
+# Generated by Django 4.2.6 on 2026-10-18 06:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("map", "0014_occupancy_forecast"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="parkingspace",
+            name="content_hash",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AddField(
+            model_name="parkingspace",
+            name="retired_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.6 on 2026-10-18 07:18
+
+from django.db import migrations
+import django.db.models.manager
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("map", "0016_idsequence"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="parkingspace",
+            options={"default_manager_name": "all_objects"},
+        ),
+        migrations.AlterModelManagers(
+            name="parkingspace",
+            managers=[
+                ("all_objects", django.db.models.manager.Manager()),
+            ],
+        ),
+    ]
@@ -1,8 +1,31 @@
 from django.db import models
 from django.utils import timezone
 
+from .geo import bounding_box, to_float
+
+
+class ParkingSpaceQuerySet(models.QuerySet):
+    def within_bbox(self, south: float, west: float, north: float, east: float):
+        """spots inside the lat/lon box, served by the (lat, lon) index"""
+        return self.filter(lat__gte=south, lat__lte=north, lon__gte=west, lon__lte=east)
+
+    def around(self, center, radius_miles: float):
+        """candidate spots for a radius search
+
+        NOTE: this is only the bounding box prefilter, callers still need
+        an exact distance check on the returned rows
+        """
+        return self.within_bbox(*bounding_box(center, radius_miles))
+
 
 # Create your models here.
+class ActiveParkingSpaceManager(models.Manager.from_queryset(ParkingSpaceQuerySet)):
+    """spots that were not retired from the dataset"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(retired_at__isnull=True)
+
+
 class ParkingSpace(models.Model):
     parking_spot_id = models.CharField(max_length=200, primary_key=True)
     address_zip = models.CharField(max_length=200)
@@ -22,6 +45,55 @@ class ParkingSpace(models.Model):
     user = models.ForeignKey("users.user", on_delete=models.CASCADE, null=True)
     vehicle_spaces_capacity = models.IntegerField(blank=True, null=True)
     available_vehicle_spaces = models.IntegerField(blank=True, null=True)
+    # * lat / lon : numeric copies of latitude / longitude, kept in sync on save
+    # * so that nearby lookups range scan an index instead of the whole table
+    lat = models.FloatField(blank=True, null=True)
+    lon = models.FloatField(blank=True, null=True)
+    # * content_hash : hash of the dataset columns the spot was loaded from,
+    # * empty for spots added on the site (see map/loader.py)
+    content_hash = models.CharField(max_length=64, blank=True, default="")
+    # * retired_at : set when the spot disappeared from the dataset, retired
+    # * spots are hidden from ParkingSpace.objects but keep their history
+    retired_at = models.DateTimeField(blank=True, null=True)
+
+    # * objects : active spots, what the site and the API show
+    # * all_objects : every spot, the default manager so that the admin,
+    # * dumpdata and related lookups still see retired spots
+    objects = ActiveParkingSpaceManager()
+    all_objects = ParkingSpaceQuerySet.as_manager()
+
+    class Meta:
+        default_manager_name = "all_objects"
+        indexes = [
+            models.Index(fields=["lat", "lon"], name="parkingspace_lat_lon_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # * remember the stored coordinates to detect moves on save
+        instance._loaded_coordinates = (
+            instance.__dict__.get("lat"),
+            instance.__dict__.get("lon"),
+        )
+        return instance
+
+    @property
+    def coordinates_changed(self) -> bool:
+        return getattr(self, "_loaded_coordinates", None) != (self.lat, self.lon)
+
+    def save(self, *args, **kwargs):
+        self.lat = to_float(self.latitude)
+        self.lon = to_float(self.longitude)
+        super(ParkingSpace, self).save(*args, **kwargs)
+        self._loaded_coordinates = (self.lat, self.lon)
+
+
+class IdSequence(models.Model):
+    """named counter handing out ids, see map/spot_ids.py"""
+
+    name = models.CharField(max_length=50, primary_key=True)
+    last_value = models.BigIntegerField(default=0)
 
 
 class OccupancyHistory(models.Model):
@@ -34,3 +106,95 @@ class OccupancyHistory(models.Model):
     )
     updated_at = models.DateTimeField(null=True)
     occupancy_percent = models.IntegerField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # * history of a spot in time order
+            models.Index(
+                fields=["parking_space", "updated_at"],
+                name="occupancyhistory_spot_time_idx",
+            ),
+        ]
+
+
+class OccupancyHourlyCount(models.Model):
+    """number of occupancy reports of a spot per weekday and hour
+
+    Maintained by map.peak_times as history rows are written, so the peak
+    time and forecast of a spot are read from at most 168 rows instead of
+    its whole history.
+    """
+
+    parking_space = models.ForeignKey(
+        "map.ParkingSpace",
+        on_delete=models.CASCADE,
+        related_name="hourly_counts",
+    )
+    # * 0 is Monday, as in datetime.weekday()
+    weekday = models.PositiveSmallIntegerField()
+    hour = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+    # * number and sum of the reports with an occupancy_percent
+    occupancy_count = models.PositiveIntegerField(default=0)
+    occupancy_sum = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["parking_space", "weekday", "hour"],
+                name="occupancyhourlycount_unique_cell",
+            )
+        ]
+
+
+class OccupancyRollup(models.Model):
+    """occupancy reports of a spot aggregated over a 15 or 60 minute bucket
+
+    Written by map.rollups in place of the history rows older than the
+    retention period.
+    """
+
+    parking_space = models.ForeignKey(
+        "map.ParkingSpace",
+        on_delete=models.CASCADE,
+        related_name="occupancy_rollups",
+    )
+    bucket_start = models.DateTimeField()
+    bucket_minutes = models.PositiveSmallIntegerField()
+    report_count = models.PositiveIntegerField(default=0)
+    # * number of reports with an occupancy_percent, the mean is over those
+    occupancy_count = models.PositiveIntegerField(default=0)
+    occupancy_sum = models.IntegerField(default=0)
+    min_occupancy_percent = models.IntegerField(blank=True, null=True)
+    max_occupancy_percent = models.IntegerField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["parking_space", "bucket_minutes", "bucket_start"],
+                name="occupancyrollup_unique_bucket",
+            )
+        ]
+
+    @property
+    def mean_occupancy_percent(self):
+        if not self.occupancy_count:
+            return None
+        return self.occupancy_sum / self.occupancy_count
+
+
+class OccupancyForecast(models.Model):
+    """expected occupancy of a spot for every hour of the week
+
+    Precomputed from the hourly counts by map.forecasts.
+    """
+
+    parking_space = models.OneToOneField(
+        "map.ParkingSpace",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="forecast",
+    )
+    # * 168 percents (or null without any data), Monday 0:00 first
+    expected_occupancy = models.JSONField()
+    computed_at = models.DateTimeField(default=timezone.now)
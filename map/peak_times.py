@@ -0,0 +1,222 @@
+"""per spot histogram of occupancy reports by weekday and hour
+
+Every OccupancyHistory row adds one to the report count of the
+OccupancyHourlyCount cell of its spot, weekday and hour (in the local
+time zone), and its occupancy to the cell's occupancy sum. The cells are
+updated by map.signals for single rows, bulk writers have to call
+record() themselves, and rebuild() recomputes the whole table from the
+history and its rollups (see map.rollups).
+"""
+import operator
+from collections import defaultdict
+from datetime import datetime
+from functools import reduce
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import ExtractHour, ExtractIsoWeekDay
+from django.utils import timezone
+
+from .models import OccupancyHistory, OccupancyHourlyCount, OccupancyRollup
+
+BATCH_SIZE = 1000
+# * cumulated fields of a cell, occupancy ones only over reports with a percent
+COUNTERS = ["count", "occupancy_count", "occupancy_sum"]
+
+Cell = Tuple[str, int, int]
+
+
+def bucket(updated_at: datetime) -> Tuple[int, int]:
+    """(weekday, hour) cell of a report time"""
+    if timezone.is_aware(updated_at):
+        updated_at = timezone.localtime(updated_at)
+    return updated_at.weekday(), updated_at.hour
+
+
+def _add(
+    parking_space_id: str, weekday: int, hour: int, amounts: Sequence[int]
+) -> None:
+    cell = OccupancyHourlyCount.objects.filter(
+        parking_space_id=parking_space_id, weekday=weekday, hour=hour
+    )
+    increments = {field: F(field) + amount for field, amount in zip(COUNTERS, amounts)}
+    if cell.update(**increments) or amounts[0] < 0:
+        return
+    try:
+        with transaction.atomic():
+            OccupancyHourlyCount.objects.create(
+                parking_space_id=parking_space_id,
+                weekday=weekday,
+                hour=hour,
+                **dict(zip(COUNTERS, amounts)),
+            )
+    except IntegrityError:
+        # * created by a concurrent report in the meantime
+        cell.update(**increments)
+
+
+def _cells(histories: Iterable[OccupancyHistory]) -> Dict[Cell, List[int]]:
+    """COUNTERS amounts of the history rows per cell"""
+    cells = defaultdict(lambda: [0] * len(COUNTERS))
+    for history in histories:
+        if history.parking_space_id is None or history.updated_at is None:
+            continue
+        amounts = cells[(history.parking_space_id, *bucket(history.updated_at))]
+        amounts[0] += 1
+        if history.occupancy_percent is not None:
+            amounts[1] += 1
+            amounts[2] += history.occupancy_percent
+    return cells
+
+
+def record(histories: Iterable[OccupancyHistory]) -> None:
+    """count newly written history rows
+
+    Cells go through one of two paths: a cold cell (first report of its
+    spot, weekday and hour) is inserted, a warm one is updated. Both are
+    bounded to the same queries however many rows and spots are given: the
+    missing cells are inserted empty at once, then every touched cell is
+    locked, read and updated in bulk.
+    """
+    cells = _cells(histories)
+    if not cells:
+        return
+    with transaction.atomic():
+        # * cells created by a concurrent report in the meantime are skipped
+        OccupancyHourlyCount.objects.bulk_create(
+            (
+                OccupancyHourlyCount(
+                    parking_space_id=parking_space_id, weekday=weekday, hour=hour
+                )
+                for parking_space_id, weekday, hour in cells
+            ),
+            ignore_conflicts=True,
+        )
+        existing = list(
+            OccupancyHourlyCount.objects.select_for_update().filter(
+                reduce(
+                    operator.or_,
+                    (
+                        Q(parking_space_id=parking_space_id, weekday=weekday, hour=hour)
+                        for parking_space_id, weekday, hour in cells
+                    ),
+                )
+            )
+        )
+        for cell in existing:
+            amounts = cells[(cell.parking_space_id, cell.weekday, cell.hour)]
+            for field, amount in zip(COUNTERS, amounts):
+                setattr(cell, field, getattr(cell, field) + amount)
+        OccupancyHourlyCount.objects.bulk_update(existing, COUNTERS)
+
+
+def forget(histories: Iterable[OccupancyHistory]) -> None:
+    """uncount deleted history rows"""
+    for (parking_space_id, weekday, hour), amounts in _cells(histories).items():
+        _add(parking_space_id, weekday, hour, [-amount for amount in amounts])
+
+
+def _grouped(queryset, time_field: str, aggregates: dict, by_weekday: bool):
+    """aggregates of a history or rollup queryset per spot and (weekday,) hour"""
+    fields = {"hour": ExtractHour(time_field)}
+    if by_weekday:
+        fields["weekday"] = ExtractIsoWeekDay(time_field)
+    return (
+        queryset.filter(**{f"{time_field}__isnull": False})
+        .annotate(**fields)
+        .values("parking_space_id", *fields)
+        .annotate(**aggregates)
+        .order_by()
+    )
+
+
+def _history_counters(by_weekday: bool, **filters) -> Dict[tuple, List[int]]:
+    """COUNTERS amounts of the raw and rolled up history, keyed by
+    (parking_space_id, weekday, hour) or (parking_space_id, hour)"""
+    totals = defaultdict(lambda: [0] * len(COUNTERS))
+    for queryset in [
+        _grouped(
+            OccupancyHistory.objects.filter(parking_space__isnull=False, **filters),
+            "updated_at",
+            {
+                "count": Count("id"),
+                "occupancy_count": Count("occupancy_percent"),
+                "occupancy_sum": Sum("occupancy_percent"),
+            },
+            by_weekday,
+        ),
+        _grouped(
+            OccupancyRollup.objects.filter(**filters),
+            "bucket_start",
+            {
+                "count": Sum("report_count"),
+                "occupancy_count": Sum("occupancy_count"),
+                "occupancy_sum": Sum("occupancy_sum"),
+            },
+            by_weekday,
+        ),
+    ]:
+        for row in queryset.iterator():
+            key = (row["parking_space_id"], row["hour"])
+            if by_weekday:
+                key = (row["parking_space_id"], row["weekday"] - 1, row["hour"])
+            for index, field in enumerate(COUNTERS):
+                totals[key][index] += row[field] or 0
+    return totals
+
+
+def rebuild() -> int:
+    """recompute every cell from the occupancy history and its rollups
+
+    Returns:
+        int: number of cells written
+    """
+    with transaction.atomic():
+        totals = _history_counters(by_weekday=True)
+        OccupancyHourlyCount.objects.all().delete()
+        cells = OccupancyHourlyCount.objects.bulk_create(
+            (
+                OccupancyHourlyCount(
+                    parking_space_id=parking_space_id,
+                    weekday=weekday,
+                    hour=hour,
+                    **dict(zip(COUNTERS, amounts)),
+                )
+                for (parking_space_id, weekday, hour), amounts in totals.items()
+            ),
+            batch_size=BATCH_SIZE,
+        )
+    return len(cells)
+
+
+def peak_hour(parking_space_id: str) -> Optional[int]:
+    """hour of the day with the most reports, the earliest one on ties
+
+    Read from the hourly counts, or aggregated from the history and its
+    rollups, depending on the PEAK_TIME_BACKEND setting.
+
+    Args:
+        parking_space_id (str): id of the spot
+
+    Returns:
+        Optional[int]: peak hour, None when the spot has no history
+    """
+    if settings.PEAK_TIME_BACKEND == "history":
+        totals = _history_counters(by_weekday=False, parking_space_id=parking_space_id)
+        hours = {hour: amounts[0] for (_, hour), amounts in totals.items()}
+        hours = {hour: count for hour, count in hours.items() if count > 0}
+        if not hours:
+            return None
+        return min(hours, key=lambda hour: (-hours[hour], hour))
+
+    peak = (
+        OccupancyHourlyCount.objects.filter(parking_space_id=parking_space_id)
+        .values("hour")
+        .annotate(total=Sum("count"))
+        .filter(total__gt=0)
+        .order_by("-total", "hour")
+        .first()
+    )
+    return peak["hour"] if peak else None
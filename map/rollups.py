@@ -0,0 +1,141 @@
+"""compaction of old occupancy history into time bucket aggregates
+
+History rows older than the retention period are folded, per spot, into
+OccupancyRollup rows of 15 or 60 minutes (report count, min / max / mean
+occupancy) and deleted, which keeps OccupancyHistory small. Rollups of a
+bucket that already exists are merged, so the job can run any number of
+times, e.g. nightly through the rollup_occupancy_history command.
+
+The hourly report counts used for peak times already include the rolled
+up rows and are left untouched. The latest report of every spot is kept
+whatever its age, it is what the spot shows as its latest update.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Tuple
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from . import tile_cache
+from .models import OccupancyHistory, OccupancyRollup
+from .signals import history_signals_muted
+
+BUCKET_MINUTES = [15, 60]
+BATCH_SIZE = 5000
+
+
+def bucket_start(updated_at: datetime, bucket_minutes: int) -> datetime:
+    """start of the bucket holding updated_at"""
+    return updated_at.replace(
+        minute=updated_at.minute - updated_at.minute % bucket_minutes,
+        second=0,
+        microsecond=0,
+    )
+
+
+def _merge(rollup: OccupancyRollup, occupancy_percent) -> None:
+    rollup.report_count += 1
+    if occupancy_percent is None:
+        return
+    rollup.occupancy_count += 1
+    rollup.occupancy_sum += occupancy_percent
+    if rollup.min_occupancy_percent is None:
+        rollup.min_occupancy_percent = rollup.max_occupancy_percent = occupancy_percent
+        return
+    rollup.min_occupancy_percent = min(rollup.min_occupancy_percent, occupancy_percent)
+    rollup.max_occupancy_percent = max(rollup.max_occupancy_percent, occupancy_percent)
+
+
+def _roll_up_batch(cutoff: datetime, bucket_minutes: int, batch_size: int) -> int:
+    with transaction.atomic():
+        rows = list(
+            OccupancyHistory.objects.select_for_update()
+            .filter(updated_at__lt=cutoff, parking_space__isnull=False)
+            # * the latest row of a spot is its latest_update in /api/spots/
+            .filter(
+                Exists(
+                    OccupancyHistory.objects.filter(
+                        parking_space=OuterRef("parking_space"), id__gt=OuterRef("id")
+                    )
+                )
+            )
+            .order_by("id")
+            .values_list("id", "parking_space_id", "updated_at", "occupancy_percent")[
+                :batch_size
+            ]
+        )
+        if not rows:
+            return 0
+
+        bucketed = [
+            (parking_space_id, bucket_start(updated_at, bucket_minutes), percent)
+            for _, parking_space_id, updated_at, percent in rows
+        ]
+        rollups: Dict[Tuple[str, datetime], OccupancyRollup] = {
+            (rollup.parking_space_id, rollup.bucket_start): rollup
+            for rollup in OccupancyRollup.objects.select_for_update().filter(
+                parking_space_id__in={key for key, _, _ in bucketed},
+                bucket_minutes=bucket_minutes,
+                bucket_start__gte=min(start for _, start, _ in bucketed),
+                bucket_start__lte=max(start for _, start, _ in bucketed),
+            )
+        }
+        existing = list(rollups.values())
+        for parking_space_id, start, occupancy_percent in bucketed:
+            key = (parking_space_id, start)
+            if key not in rollups:
+                rollups[key] = OccupancyRollup(
+                    parking_space_id=parking_space_id,
+                    bucket_start=start,
+                    bucket_minutes=bucket_minutes,
+                )
+            _merge(rollups[key], occupancy_percent)
+
+        OccupancyRollup.objects.bulk_update(
+            existing,
+            [
+                "report_count",
+                "occupancy_count",
+                "occupancy_sum",
+                "min_occupancy_percent",
+                "max_occupancy_percent",
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        OccupancyRollup.objects.bulk_create(
+            [rollup for rollup in rollups.values() if rollup.pk is None],
+            batch_size=BATCH_SIZE,
+        )
+        # * the rows stay counted in the hourly counts
+        with history_signals_muted():
+            OccupancyHistory.objects.filter(id__in=[row[0] for row in rows]).delete()
+    return len(rows)
+
+
+def roll_up(
+    retention_days: int, bucket_minutes: int = 60, batch_size: int = BATCH_SIZE
+) -> int:
+    """fold the history older than retention_days into rollups
+
+    Args:
+        retention_days (int): days of raw history to keep
+        bucket_minutes (int): 15 or 60
+        batch_size (int): history rows folded per transaction
+
+    Returns:
+        int: number of history rows rolled up
+    """
+    if bucket_minutes not in BUCKET_MINUTES:
+        raise ValueError(f"bucket_minutes must be one of {BUCKET_MINUTES}")
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    rolled_up = 0
+    while True:
+        count = _roll_up_batch(cutoff, bucket_minutes, batch_size)
+        if not count:
+            break
+        rolled_up += count
+    if rolled_up:
+        # * the full history of /api/spots/ payloads lost rows
+        tile_cache.invalidate_all()
+    return rolled_up
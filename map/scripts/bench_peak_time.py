@@ -0,0 +1,84 @@
+"""benchmark of the peak time engines
+
+Times, for one spot with N history rows:
+  - python : every row loaded and bucketed by hour in python (the original
+    PeakTimeView loop)
+  - history : PEAK_TIME_BACKEND = "history", one GROUP BY hour query
+  - counts : PEAK_TIME_BACKEND = "counts", read from OccupancyHourlyCount
+
+The rows are written in a transaction that is rolled back at the end.
+
+    python manage.py runscript bench_peak_time --script-args 10000 100000 1000000
+"""
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.test.utils import override_settings
+
+from .. import peak_times
+from ..models import OccupancyHistory, ParkingSpace
+
+DEFAULT_HISTORY_SIZES = [10_000, 100_000, 1_000_000]
+BATCH_SIZE = 10_000
+SPOT_ID = "bench-peak-time"
+
+
+def python_peak_hour(parking_space_id: str):
+    times = Counter(
+        updated_at.hour
+        for updated_at in OccupancyHistory.objects.filter(
+            parking_space_id=parking_space_id
+        ).values_list("updated_at", flat=True)
+    )
+    if not times:
+        return None
+    return min(times, key=lambda hour: (-times[hour], hour))
+
+
+def add_history(parking_space: ParkingSpace, count: int) -> None:
+    start = datetime(2023, 1, 1)
+    for offset in range(0, count, BATCH_SIZE):
+        histories = OccupancyHistory.objects.bulk_create(
+            OccupancyHistory(
+                parking_space=parking_space,
+                updated_at=start + timedelta(minutes=random.randrange(525_600)),
+                occupancy_percent=random.randrange(0, 110, 10),
+            )
+            for _ in range(min(BATCH_SIZE, count - offset))
+        )
+        peak_times.record(histories)
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def run(*args):
+    sizes = [int(arg) for arg in args] or DEFAULT_HISTORY_SIZES
+    print(f"{'rows':>9} {'python (ms)':>12} {'history (ms)':>13} {'counts (ms)':>12}")
+    with transaction.atomic():
+        parking_space = ParkingSpace.objects.create(parking_spot_id=SPOT_ID)
+        rows = 0
+        for size in sorted(sizes):
+            add_history(parking_space, size - rows)
+            rows = size
+
+            results, timings = [], []
+            result, elapsed = timed(python_peak_hour, SPOT_ID)
+            results.append(result)
+            timings.append(elapsed)
+            for backend in ["history", "counts"]:
+                with override_settings(PEAK_TIME_BACKEND=backend):
+                    result, elapsed = timed(peak_times.peak_hour, SPOT_ID)
+                results.append(result)
+                timings.append(elapsed)
+            assert len(set(results)) == 1, results
+            print(
+                f"{size:>9} {timings[0]:>12.1f} {timings[1]:>13.1f} {timings[2]:>12.1f}"
+            )
+        transaction.set_rollback(True)
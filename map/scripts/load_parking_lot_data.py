@@ -1,10 +1,8 @@
 import os
-import csv
 from tqdm import tqdm
 from pathlib import Path
-from django.db.utils import IntegrityError
 
-from ..models import ParkingSpace
+from .. import loader
 
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 csv_file_path = os.path.join(BASE_DIR, "data/concat_result.csv")
@@ -13,23 +11,8 @@ csv_file_path = os.path.join(BASE_DIR, "data/concat_result.csv")
 def run():
     print(f"csv file path is: {csv_file_path}")
 
-    count = 0
-    with open(csv_file_path, "r") as file:
-        reader = csv.DictReader(file)
-        for row in tqdm(reader):
-            try:
-                ParkingSpace.objects.create(
-                    type=row["type"],
-                    detail=row["detail"],
-                    borough=row["borough"],
-                    latitude=row["latitude"],
-                    longitude=row["longitude"],
-                    address_zip=row["address_zip"],
-                    operation_hours=row["operation_hours"],
-                    parking_spot_id=row["parking_spot_id"],
-                    parking_spot_name=row["parking_spot_name"],
-                )
-                count += 1
-            except IntegrityError:
-                print(f"Skipping Parking Space Record[{row['parking_spot_id']}]")
-    print(f"{count} records added!")
+    counts = loader.load_spots(tqdm(loader.read_rows(csv_file_path)))
+    print(
+        f"{counts.inserted} records added, {counts.updated} updated, "
+        f"{counts.skipped} skipped!"
+    )
@@ -0,0 +1,84 @@
+import threading
+from contextlib import contextmanager
+
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete
+
+from users.models import UserVerification
+from . import clustering, peak_times, spatial, tile_cache
+from .models import ParkingSpace, OccupancyHistory
+
+
+_state = threading.local()
+
+
+@contextmanager
+def history_signals_muted():
+    """skip the OccupancyHistory receivers, for writers that keep the
+    caches and hourly counts up to date themselves"""
+    # * restored rather than reset, so that nested uses stay muted
+    muted = _history_muted()
+    _state.history_muted = True
+    try:
+        yield
+    finally:
+        _state.history_muted = muted
+
+
+def _history_muted() -> bool:
+    return getattr(_state, "history_muted", False)
+
+
+def spot_changed(lat, lon):
+    """drop every cached payload built from a spot at (lat, lon)"""
+    tile_cache.invalidate_spot(lat, lon)
+    clustering.invalidate_spot(lat, lon)
+
+
+@receiver(post_save, sender=ParkingSpace)
+def parkingspace_saved(sender, instance, created, **kwargs):
+    spot_changed(instance.lat, instance.lon)
+    # * occupancy updates also save the spot, only rebuild the spatial
+    # * index when a spot is added or its coordinates actually changed
+    if created or instance.coordinates_changed:
+        spatial.bump_version()
+        if not created:
+            spot_changed(*instance._loaded_coordinates)
+
+
+@receiver(post_delete, sender=ParkingSpace)
+def parkingspace_deleted(sender, instance, **kwargs):
+    spot_changed(instance.lat, instance.lon)
+    spatial.bump_version()
+
+
+@receiver(post_save, sender=OccupancyHistory)
+@receiver(post_delete, sender=OccupancyHistory)
+def occupancy_history_changed(sender, instance, **kwargs):
+    if _history_muted():
+        return
+    if sender.parking_space.is_cached(instance):
+        spot = instance.parking_space
+    else:
+        spot = ParkingSpace.objects.filter(pk=instance.parking_space_id).first()
+    if spot is not None:
+        spot_changed(spot.lat, spot.lon)
+
+
+@receiver(post_save, sender=OccupancyHistory)
+def occupancy_history_saved(sender, instance, created, **kwargs):
+    if created and not _history_muted():
+        peak_times.record([instance])
+
+
+@receiver(post_delete, sender=OccupancyHistory)
+def occupancy_history_deleted(sender, instance, **kwargs):
+    if not _history_muted():
+        peak_times.forget([instance])
+
+
+@receiver(post_save, sender=UserVerification)
+@receiver(post_delete, sender=UserVerification)
+def user_verification_changed(sender, instance, **kwargs):
+    # * spot payloads nest the verification status of owners and reporters
+    tile_cache.invalidate_all()
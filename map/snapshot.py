@@ -0,0 +1,65 @@
+"""typed columnar snapshot of the preprocessed parking spot dataset
+
+data/scripts/concat_files.py saves every column of concat_result.csv as
+its own .npy file: the coordinates as float64 (NaN when missing), the
+other columns as fixed width unicode. The columns are memory mapped, so
+reading them costs no csv parsing and no copy until the values are used.
+
+The snapshot is a local build artifact, it is not committed. load_map_data
+reads it when given its folder as --file.
+"""
+import os
+from typing import Dict, Iterator, List
+
+import numpy as np
+
+# * rows copied out of the memory mapped columns at once by read_rows
+READ_CHUNK_SIZE = 2000
+
+
+def exists(path: str) -> bool:
+    return bool(path) and os.path.isdir(path)
+
+
+def open_columns(path: str, names: List[str]) -> Dict[str, np.ndarray]:
+    """memory map the given columns of a snapshot
+
+    Args:
+        path (str): snapshot folder
+        names (List[str]): names of the columns to open
+
+    Returns:
+        Dict[str, np.ndarray]: read only array of each column
+    """
+    return {
+        name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        for name in names
+    }
+
+
+def as_text(value) -> str:
+    """csv text of a snapshot value, as concat_files.py writes it"""
+    if isinstance(value, float):
+        return "" if np.isnan(value) else repr(value)
+    return str(value)
+
+
+def read_rows(path: str, names: List[str]) -> Iterator[Dict[str, str]]:
+    """stream the rows of a snapshot as the csv rows it was saved from
+
+    Args:
+        path (str): snapshot folder
+        names (List[str]): names of the columns to read
+
+    Returns:
+        Iterator[Dict[str, str]]: rows, with their values as text
+    """
+    columns = open_columns(path, names)
+    size = len(columns[names[0]]) if names else 0
+    for start in range(0, size, READ_CHUNK_SIZE):
+        # * tolist() turns the numpy scalars into python str and float
+        values = [
+            columns[name][start : start + READ_CHUNK_SIZE].tolist() for name in names
+        ]
+        for row in zip(*values):
+            yield {name: as_text(value) for name, value in zip(names, row)}
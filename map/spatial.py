@@ -0,0 +1,123 @@
+"""in-process spatial index over the parking spot coordinates
+
+All spot coordinates are kept in contiguous float64 arrays so that a
+radius query is a single vectorized haversine pass instead of one python
+call per spot.
+
+The index is rebuilt lazily whenever the shared version counter (bumped by
+map.signals when spots are created, moved or deleted) differs from the
+version it was built with, or when it is older than
+PARKING_SPOT_INDEX_MAX_AGE seconds. The counter lives in the default cache,
+so it is only shared between workers when that cache is.
+"""
+import time
+import threading
+from typing import List, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .geo import EARTH_RADIUS_MILES
+
+VERSION_CACHE_KEY = "map:spot-index:version"
+
+
+def haversine_miles(
+    center: Tuple[float, float], lats: np.ndarray, lons: np.ndarray
+) -> np.ndarray:
+    """vectorized haversine distance in miles from center to every point"""
+    lat1, lon1 = np.radians(center[0]), np.radians(center[1])
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(a))
+
+
+def get_version() -> int:
+    return cache.get_or_set(VERSION_CACHE_KEY, 0, timeout=None)
+
+
+def bump_version() -> None:
+    """mark every loaded index as stale"""
+    try:
+        cache.incr(VERSION_CACHE_KEY)
+    except ValueError:
+        cache.set(VERSION_CACHE_KEY, 1, timeout=None)
+
+
+class SpotIndex:
+    """coordinates of every located parking spot, as numpy arrays"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # * (ids, lat in radians, lon in radians, cos(lat)), swapped as a whole
+        # * so that concurrent readers never see arrays from two different loads
+        empty = np.empty(0, dtype=np.float64)
+        self._arrays = (np.empty(0, dtype=object), empty, empty, empty)
+        self._version = None
+        self._loaded_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._arrays[0])
+
+    def load(self, rows) -> None:
+        """(re)build the arrays from (parking_spot_id, lat, lon) rows"""
+        ids, lats, lons = [], [], []
+        for pk, lat, lon in rows:
+            ids.append(pk)
+            lats.append(lat)
+            lons.append(lon)
+        lat_rad = np.radians(np.ascontiguousarray(lats, dtype=np.float64))
+        lon_rad = np.radians(np.ascontiguousarray(lons, dtype=np.float64))
+        self._arrays = (
+            np.array(ids, dtype=object),
+            lat_rad,
+            lon_rad,
+            np.cos(lat_rad),
+        )
+
+    def refresh(self) -> None:
+        from .models import ParkingSpace
+
+        with self._lock:
+            version = get_version()
+            self.load(
+                ParkingSpace.objects.filter(
+                    lat__isnull=False, lon__isnull=False
+                ).values_list("parking_spot_id", "lat", "lon")
+            )
+            self._version = version
+            self._loaded_at = time.monotonic()
+
+    def ensure_fresh(self) -> None:
+        max_age = getattr(settings, "PARKING_SPOT_INDEX_MAX_AGE", 300)
+        is_expired = time.monotonic() - self._loaded_at > max_age
+        if self._version is None or is_expired or self._version != get_version():
+            self.refresh()
+
+    def nearby_ids(self, center: Tuple[float, float], radius_miles: float) -> List:
+        """primary keys of the spots strictly within radius_miles of center
+
+        Args:
+            center (Tuple[float, float]): (lat, lon) in degrees
+            radius_miles (float): search radius in miles
+
+        Returns:
+            List: parking_spot_id of every matching spot
+        """
+        self.ensure_fresh()
+        ids, lat_rad, lon_rad, cos_lat = self._arrays
+        lat1, lon1 = np.radians(center[0]), np.radians(center[1])
+        a = (
+            np.sin((lat_rad - lat1) / 2) ** 2
+            + np.cos(lat1) * cos_lat * np.sin((lon_rad - lon1) / 2) ** 2
+        )
+        # * compare in haversine space to skip the arcsin / sqrt per spot
+        max_a = np.sin(min(radius_miles / EARTH_RADIUS_MILES, np.pi) / 2) ** 2
+        return ids[a < max_a].tolist()
+
+
+spot_index = SpotIndex()
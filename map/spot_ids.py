@@ -0,0 +1,82 @@
+"""ids of the parking spots added on the site
+
+Ids come from a row of the IdSequence table, incremented in place, so
+handing one out is a single row update whatever the size of the spot
+table, and concurrent requests never get the same id: the update locks
+the row until the allocation commits.
+
+The sequence starts after the largest numeric id stored when it is first
+used. Dataset spots loaded later can still take an id ahead of the
+sequence, create_spot then skips to the next one.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import IdSequence, ParkingSpace
+
+SEQUENCE_NAME = "parking_space"
+# * ids tried by create_spot before giving up
+MAX_ATTEMPTS = 100
+
+
+def _largest_numeric_id() -> int:
+    """largest purely numeric parking_spot_id, 0 when there is none"""
+    return max(
+        (
+            int(spot_id)
+            for spot_id in ParkingSpace.all_objects.values_list(
+                "parking_spot_id", flat=True
+            ).iterator()
+            if spot_id.isdigit()
+        ),
+        default=0,
+    )
+
+
+def next_value(name: str = SEQUENCE_NAME) -> int:
+    """increment a sequence and return its new value
+
+    Args:
+        name (str): name of the sequence, created on first use
+
+    Returns:
+        int: value of the sequence, never returned twice
+    """
+    with transaction.atomic():
+        sequence = IdSequence.objects.filter(name=name)
+        if not sequence.update(last_value=F("last_value") + 1):
+            try:
+                with transaction.atomic():
+                    return IdSequence.objects.create(
+                        name=name, last_value=_largest_numeric_id() + 1
+                    ).last_value
+            except IntegrityError:
+                # * created by a concurrent allocation in the meantime
+                sequence.update(last_value=F("last_value") + 1)
+        return sequence.values_list("last_value", flat=True).get()
+
+
+def next_spot_id() -> str:
+    return str(next_value(SEQUENCE_NAME))
+
+
+def create_spot(spot: ParkingSpace) -> ParkingSpace:
+    """insert a new spot under the next free id
+
+    Args:
+        spot (ParkingSpace): unsaved spot, its parking_spot_id is overwritten
+
+    Returns:
+        ParkingSpace: the saved spot
+    """
+    for _ in range(MAX_ATTEMPTS):
+        spot.parking_spot_id = next_spot_id()
+        try:
+            with transaction.atomic():
+                # * an update of the spot already holding the id otherwise
+                spot.save(force_insert=True)
+            return spot
+        except IntegrityError:
+            # * id taken by a dataset spot, try the next one
+            continue
+    raise IntegrityError(f"no free parking spot id in {MAX_ATTEMPTS} attempts")
@@ -1,9 +1,35 @@
-from django.test import TestCase
+import csv
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stderr, redirect_stdout
+from datetime import datetime, timedelta
+from io import StringIO
+
+import numpy as np
+from django.core.management import call_command
+from django.db import connections
+from django.test import (
+    TestCase,
+    TransactionTestCase,
+    skipUnlessDBFeature,
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
 from users.models import User, Post, UserVerification
-from .models import ParkingSpace
+from . import forecasts, loader, peak_times, spatial, spot_ids
+from .models import (
+    OccupancyForecast,
+    OccupancyHistory,
+    OccupancyHourlyCount,
+    OccupancyRollup,
+    ParkingSpace,
+)
+from .signals import history_signals_muted
+from .spatial import spot_index
+from .tests_preprocess import load_preprocess_utils
 from .views import ParkingSpaceView
 from .forms import CreateParkingSpaceForm
 
@@ -19,6 +45,18 @@ LONGITUDE = "-73.9853043125"
 LATITUDE = "40.7486538125"
 PARKING_SPOT_NAME = "Empire State Building"
 
+
+def save_snapshot(csv_path: str, snapshot_path: str) -> None:
+    """save the snapshot of a preprocessed csv file, as concat_files.py does"""
+    utils = load_preprocess_utils()
+    with redirect_stdout(StringIO()):
+        utils.save_npy_snapshot(
+            snapshot_path,
+            utils.read_csv_rows(csv_path),
+            floatColumns=["longitude", "latitude"],
+        )
+
+
 TITLE = "Parking Here For 15 Minutes"
 POST = "After 3:15, I'll be gone."
 DATE = timezone.now()
@@ -27,6 +65,7 @@ POST_PATH_NAME = "map:post"
 ADD_SPOT_PATH_NAME = "map:add-parking-space"
 REDIRECT_SPOT_PATH_NAME = "map:spot-redirect"
 MAP_PATH_NAME = "map:parking"
+PEAK_TIME_PATH_NAME = "map:peak-time"
 POST_TEMPLATE = "map/post.html"
 
 
@@ -82,13 +121,12 @@ class ParkingSpaceViewTests(TestCase):
         self.assertIsNotNone(response_with_lat_lon.context.get("user_verification"))
 
     def test_get_next_parking_space_id(self):
-        parking_space_view = ParkingSpaceView()
-        id = parking_space_view._ParkingSpaceView__get_next_parkingspace_id()
+        id = spot_ids.next_spot_id()
         self.assertEqual(id, "1")
 
         # * Test if adding new record generates new ID of 2
         self.new_parking_spot = ParkingSpace.objects.create(parking_spot_id=1)
-        id = parking_space_view._ParkingSpaceView__get_next_parkingspace_id()
+        id = spot_ids.next_spot_id()
         self.assertEqual(id, "2")
 
     def test_post_view(self):
@@ -137,6 +175,52 @@ class ParkingSpaceViewTests(TestCase):
         self.assertIsNotNone(response_with_invalid_data.context.get("form"))
 
 
+class SpotIdTests(TestCase):
+    def test_starts_after_numeric_ids(self):
+        for spot_id in ["0932155-DCA", "1083076", "999"]:
+            ParkingSpace.objects.create(parking_spot_id=spot_id)
+        self.assertEqual(spot_ids.next_spot_id(), "1083077")
+
+        # * with the sequence in place, an id costs a single update and read
+        # * (and the savepoint around them)
+        with self.assertNumQueries(4):
+            self.assertEqual(spot_ids.next_value(), 1083078)
+
+    def test_skips_taken_ids(self):
+        spot_ids.next_spot_id()
+        ParkingSpace.objects.create(parking_spot_id="2", parking_spot_name="dataset")
+
+        spot = spot_ids.create_spot(ParkingSpace(parking_spot_name="new"))
+        self.assertEqual(spot.parking_spot_id, "3")
+        self.assertEqual(
+            ParkingSpace.objects.get(parking_spot_id="2").parking_spot_name, "dataset"
+        )
+
+
+@skipUnlessDBFeature("test_db_allows_multiple_connections")
+class SpotIdConcurrencyTests(TransactionTestCase):
+    """parallel "Add Spot" submissions"""
+
+    THREADS = 8
+
+    def create(self, i):
+        try:
+            return spot_ids.create_spot(
+                ParkingSpace(parking_spot_name=f"{PARKING_SPOT_NAME} {i}")
+            ).parking_spot_id
+        finally:
+            connections.close_all()
+
+    def test_parallel_creations(self):
+        with ThreadPoolExecutor(max_workers=self.THREADS) as executor:
+            created = list(executor.map(self.create, range(self.THREADS)))
+
+        self.assertEqual(
+            sorted(created, key=int), [str(i) for i in range(1, self.THREADS + 1)]
+        )
+        self.assertEqual(ParkingSpace.objects.count(), self.THREADS)
+
+
 class ProfileSpotRedirectViewTests(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -204,3 +288,536 @@ class CreatePostTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertFormError(response, "form", "title", "This field is required.")
         self.assertFormError(response, "form", "post", "This field is required.")
+
+
+class SpotIndexTests(TestCase):
+    def setUp(self):
+        self.test_spot = ParkingSpace.objects.create(
+            parking_spot_id=PARKING_SPOT_ID,
+            address_zip=ADDRESS_ZIP,
+            longitude=LONGITUDE,
+            latitude=LATITUDE,
+            parking_spot_name=PARKING_SPOT_NAME,
+        )
+        self.center = (float(LATITUDE), float(LONGITUDE))
+
+    def test_nearby_ids(self):
+        self.assertIn(PARKING_SPOT_ID, spot_index.nearby_ids(self.center, 1))
+        # * about 1.1 miles north of the center
+        self.assertNotIn(
+            PARKING_SPOT_ID,
+            spot_index.nearby_ids((self.center[0] + 0.016, self.center[1]), 1),
+        )
+
+    def test_refresh_on_spot_changes(self):
+        spot_index.nearby_ids(self.center, 1)
+
+        # * a new spot is visible right away
+        ParkingSpace.objects.create(
+            parking_spot_id="1", latitude=LATITUDE, longitude=LONGITUDE
+        )
+        self.assertIn("1", spot_index.nearby_ids(self.center, 1))
+
+        # * moving a spot away removes it from the old area
+        self.test_spot.latitude = "41.7486538125"
+        self.test_spot.save()
+        self.assertNotIn(PARKING_SPOT_ID, spot_index.nearby_ids(self.center, 1))
+
+        # * deleted spots disappear
+        ParkingSpace.objects.get(parking_spot_id="1").delete()
+        self.assertNotIn("1", spot_index.nearby_ids(self.center, 1))
+
+    def test_occupancy_update_keeps_index(self):
+        spot_index.nearby_ids(self.center, 1)
+        version = spot_index._version
+
+        spot = ParkingSpace.objects.get(parking_spot_id=PARKING_SPOT_ID)
+        spot.occupancy_percent = 50
+        spot.save()
+        spot_index.nearby_ids(self.center, 1)
+        self.assertEqual(spot_index._version, version)
+
+
+class PeakTimeTests(TestCase):
+    def setUp(self):
+        self.test_spot = ParkingSpace.objects.create(
+            parking_spot_id=PARKING_SPOT_ID,
+            address_zip=ADDRESS_ZIP,
+            longitude=LONGITUDE,
+            latitude=LATITUDE,
+            parking_spot_name=PARKING_SPOT_NAME,
+        )
+        # * a Monday, the first report has no microseconds
+        monday = datetime(2023, 11, 6, 9, 0, 0)
+        for updated_at in [
+            monday,
+            monday.replace(minute=30, microsecond=1),
+            monday.replace(hour=17),
+            monday.replace(day=7, hour=17),
+            monday.replace(day=8, hour=17),
+        ]:
+            OccupancyHistory.objects.create(
+                parking_space=self.test_spot,
+                updated_at=updated_at,
+                occupancy_percent=50,
+            )
+
+    def get_peak_time(self):
+        """peak time of the test spot, checking every backend agrees"""
+        peak_times = set()
+        for backend in ["counts", "history"]:
+            with self.settings(PEAK_TIME_BACKEND=backend):
+                response = self.client.get(
+                    reverse(PEAK_TIME_PATH_NAME, args=[PARKING_SPOT_ID])
+                )
+            peak_times.add(response.json()["peak_time"])
+        self.assertEqual(len(peak_times), 1)
+        return peak_times.pop()
+
+    def test_peak_time(self):
+        self.assertEqual(self.get_peak_time(), "17 o'clock")
+        self.assertEqual(
+            OccupancyHourlyCount.objects.get(
+                parking_space=self.test_spot, weekday=0, hour=9
+            ).count,
+            2,
+        )
+
+        OccupancyHistory.objects.filter(updated_at__hour=17).first().delete()
+        OccupancyHistory.objects.filter(updated_at__hour=17).first().delete()
+        # * ties go to the earliest hour
+        self.assertEqual(self.get_peak_time(), "09 o'clock")
+
+        OccupancyHistory.objects.all().delete()
+        self.assertEqual(self.get_peak_time(), "Not enough past data.")
+
+    def test_rebuild(self):
+        cells = list(
+            OccupancyHourlyCount.objects.order_by("weekday", "hour").values_list(
+                "weekday", "hour", "count"
+            )
+        )
+        self.assertEqual(cells, [(0, 9, 2), (0, 17, 1), (1, 17, 1), (2, 17, 1)])
+
+        OccupancyHourlyCount.objects.all().delete()
+        call_command("rebuild_peak_times", stdout=StringIO())
+        self.assertEqual(
+            list(
+                OccupancyHourlyCount.objects.order_by("weekday", "hour").values_list(
+                    "weekday", "hour", "count"
+                )
+            ),
+            cells,
+        )
+
+    def test_nested_muted_signals(self):
+        with history_signals_muted():
+            with history_signals_muted():
+                pass
+            # * still muted once the inner block is left
+            OccupancyHistory.objects.create(
+                parking_space=self.test_spot, updated_at=datetime(2023, 11, 11, 12)
+            )
+        self.assertFalse(OccupancyHourlyCount.objects.filter(weekday=5).exists())
+
+    def test_record_query_count(self):
+        def record(spot_count):
+            """queries of recording one report per spot at hour 12 of a Saturday"""
+            histories = [
+                OccupancyHistory(
+                    parking_space_id=str(spot_id),
+                    updated_at=datetime(2023, 11, 11, 12),
+                    occupancy_percent=50,
+                )
+                for spot_id in range(spot_count)
+            ]
+            with CaptureQueriesContext(connections["default"]) as queries:
+                peak_times.record(histories)
+            return [query["sql"] for query in queries]
+
+        for spot_id in range(3):
+            ParkingSpace.objects.create(parking_spot_id=str(spot_id))
+
+        # * cold path, the cells are created
+        cold = record(1)
+        self.assertTrue(any(sql.startswith("INSERT") for sql in cold))
+        self.assertEqual(len(record(3)), len(cold))
+        # * warm path, the same cells are updated
+        warm = record(3)
+        self.assertTrue(any(sql.startswith("UPDATE") for sql in warm))
+        self.assertEqual(len(warm), len(cold))
+        self.assertEqual(
+            list(
+                OccupancyHourlyCount.objects.filter(weekday=5)
+                .order_by("parking_space_id")
+                .values_list("parking_space_id", "count", "occupancy_sum")
+            ),
+            [("0", 3, 150), ("1", 2, 100), ("2", 2, 100)],
+        )
+
+
+class OccupancyRollupTests(TestCase):
+    def setUp(self):
+        self.test_spot = ParkingSpace.objects.create(
+            parking_spot_id=PARKING_SPOT_ID,
+            address_zip=ADDRESS_ZIP,
+            longitude=LONGITUDE,
+            latitude=LATITUDE,
+            parking_spot_name=PARKING_SPOT_NAME,
+        )
+        self.old = (timezone.now() - timedelta(days=100)).replace(minute=5)
+        for minutes, percent in [(0, 10), (20, 50), (40, 90), (50, None)]:
+            self.add_history(self.old + timedelta(minutes=minutes), percent)
+        self.recent = self.add_history(timezone.now(), 30)
+
+    def add_history(self, updated_at, occupancy_percent):
+        return OccupancyHistory.objects.create(
+            parking_space=self.test_spot,
+            updated_at=updated_at,
+            occupancy_percent=occupancy_percent,
+        )
+
+    def roll_up(self, *args):
+        call_command("rollup_occupancy_history", *args, stdout=StringIO())
+
+    def test_hourly_rollup(self):
+        counts = list(
+            OccupancyHourlyCount.objects.values_list(
+                "weekday", "hour", "count"
+            ).order_by("weekday", "hour")
+        )
+        self.roll_up("--retention-days=30")
+
+        self.assertEqual(list(OccupancyHistory.objects.all()), [self.recent])
+        rollup = OccupancyRollup.objects.get()
+        self.assertEqual(rollup.bucket_minutes, 60)
+        self.assertEqual(
+            rollup.bucket_start, self.old.replace(minute=0, second=0, microsecond=0)
+        )
+        self.assertEqual(rollup.report_count, 4)
+        self.assertEqual(rollup.min_occupancy_percent, 10)
+        self.assertEqual(rollup.max_occupancy_percent, 90)
+        self.assertEqual(rollup.mean_occupancy_percent, 50)
+
+        # * rolled up reports still count for peak times
+        self.assertEqual(
+            list(
+                OccupancyHourlyCount.objects.values_list(
+                    "weekday", "hour", "count"
+                ).order_by("weekday", "hour")
+            ),
+            counts,
+        )
+        peak_hours = set()
+        for backend in ["counts", "history"]:
+            with self.settings(PEAK_TIME_BACKEND=backend):
+                peak_hours.add(peak_times.peak_hour(PARKING_SPOT_ID))
+        self.assertEqual(peak_hours, {self.old.hour})
+        peak_times.rebuild()
+        self.assertEqual(
+            list(
+                OccupancyHourlyCount.objects.values_list(
+                    "weekday", "hour", "count"
+                ).order_by("weekday", "hour")
+            ),
+            counts,
+        )
+
+        # * reports of an already rolled up bucket are merged into it
+        self.add_history(self.old, 0)
+        self.add_history(timezone.now(), 30)
+        self.roll_up("--retention-days=30")
+        rollup.refresh_from_db()
+        self.assertEqual(rollup.report_count, 5)
+        self.assertEqual(rollup.min_occupancy_percent, 0)
+        self.assertEqual(rollup.mean_occupancy_percent, 37.5)
+
+    def test_quarter_hour_rollup(self):
+        self.roll_up("--retention-days=30", "--bucket-minutes=15", "--batch-size=2")
+        self.assertEqual(
+            list(
+                OccupancyRollup.objects.order_by("bucket_start").values_list(
+                    "bucket_start__minute", "report_count"
+                )
+            ),
+            [(0, 1), (15, 1), (45, 2)],
+        )
+        self.assertEqual(OccupancyHistory.objects.count(), 1)
+
+    def test_summary_includes_rollups(self):
+        def summary():
+            response = self.client.get(
+                reverse("api:spots-near-center")
+                + f"?lat={LATITUDE}&lon={LONGITUDE}&history=latest&summary=true"
+            )
+            return response.data[0]["occupancy_summary"]
+
+        before = summary()
+        self.assertEqual(before, {"history_count": 5, "mean_occupancy_percent": 45})
+        self.roll_up("--retention-days=30")
+        self.assertEqual(OccupancyHistory.objects.count(), 1)
+        self.assertEqual(summary(), before)
+
+    def test_latest_report_kept(self):
+        self.recent.delete()
+        self.roll_up("--retention-days=30")
+
+        latest = OccupancyHistory.objects.get()
+        self.assertEqual(latest.updated_at, self.old + timedelta(minutes=50))
+        self.assertEqual(OccupancyRollup.objects.get().report_count, 3)
+        response = self.client.get(
+            reverse("api:spots-near-center")
+            + f"?lat={LATITUDE}&lon={LONGITUDE}&history=latest"
+        )
+        self.assertIsNotNone(response.data[0]["latest_update"])
+        self.assertEqual(
+            response.data[0]["latest_update"]["parking_space"], PARKING_SPOT_ID
+        )
+
+
+class ForecastTests(TestCase):
+    def setUp(self):
+        self.test_spot = ParkingSpace.objects.create(
+            parking_spot_id=PARKING_SPOT_ID,
+            address_zip=ADDRESS_ZIP,
+            longitude=LONGITUDE,
+            latitude=LATITUDE,
+            parking_spot_name=PARKING_SPOT_NAME,
+        )
+        ParkingSpace.objects.create(parking_spot_id="1")
+        # * Mondays at 9 are full, any other report is empty
+        monday = datetime(2023, 11, 6, 9)
+        for updated_at, percent in [
+            (monday, 100),
+            (monday + timedelta(days=7), 100),
+            (monday + timedelta(days=7, minutes=30), None),
+            (monday + timedelta(days=1), 0),
+            (monday + timedelta(hours=8), 0),
+        ]:
+            OccupancyHistory.objects.create(
+                parking_space=self.test_spot,
+                updated_at=updated_at,
+                occupancy_percent=percent,
+            )
+
+    def test_expected_occupancy(self):
+        sums = np.zeros((1, 7, 24))
+        counts = np.zeros((1, 7, 24))
+        sums[0, 0, 9], counts[0, 0, 9] = 200, 2
+        counts[0, 1, 9] = counts[0, 0, 17] = 1
+
+        expected = forecasts.expected_occupancy(sums, counts)[0]
+        overall = 50
+        hour_9 = (200 + forecasts.PRIOR_WEIGHT * overall) / (3 + forecasts.PRIOR_WEIGHT)
+        self.assertAlmostEqual(
+            expected[0, 9],
+            (200 + forecasts.PRIOR_WEIGHT * hour_9) / (2 + forecasts.PRIOR_WEIGHT),
+        )
+        self.assertAlmostEqual(expected[3, 9], hour_9)
+        # * hours without reports fall back on the overall mean
+        self.assertAlmostEqual(expected[3, 3], overall)
+        self.assertGreater(expected[0, 9], expected[1, 9])
+        self.assertGreater(expected[1, 9], expected[0, 17])
+
+    def test_precompute(self):
+        # * the hourly counts keep the occupancy sums rebuild_peak_times computes
+        counters = list(
+            OccupancyHourlyCount.objects.order_by("weekday", "hour").values_list(
+                "weekday", "hour", *peak_times.COUNTERS
+            )
+        )
+        self.assertIn((0, 9, 3, 2, 200), counters)
+        peak_times.rebuild()
+        self.assertEqual(
+            list(
+                OccupancyHourlyCount.objects.order_by("weekday", "hour").values_list(
+                    "weekday", "hour", *peak_times.COUNTERS
+                )
+            ),
+            counters,
+        )
+
+        call_command("precompute_forecasts", stdout=StringIO())
+        # * spots without data get no forecast
+        forecast = OccupancyForecast.objects.get()
+        self.assertEqual(len(forecast.expected_occupancy), forecasts.HOURS_PER_WEEK)
+
+        hours = forecasts.next_hours(
+            forecast.expected_occupancy, datetime(2023, 11, 13, 8, 30), hours=3
+        )
+        self.assertEqual(hours, forecast.expected_occupancy[8:11])
+        self.assertEqual(max(hours), hours[1])
+        # * Sunday night wraps around to Monday morning
+        self.assertEqual(
+            forecasts.next_hours(
+                forecast.expected_occupancy, datetime(2023, 11, 12, 23), hours=2
+            ),
+            [forecast.expected_occupancy[-1], forecast.expected_occupancy[0]],
+        )
+
+
+class LoadMapDataTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.directory.name, "spots.csv")
+        self.rows = [
+            {
+                "parking_spot_id": str(i),
+                "type": "Business",
+                "parking_spot_name": f"{PARKING_SPOT_NAME} {i}",
+                "address_zip": ADDRESS_ZIP,
+                "borough": "Manhattan",
+                "detail": "Vehicle Spaces: 10",
+                "longitude": LONGITUDE,
+                "latitude": LATITUDE,
+                "operation_hours": "unknown",
+            }
+            for i in range(5)
+        ]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_csv(self, rows):
+        with open(self.csv_path, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=loader.FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+
+    def load(self, *args):
+        stdout = StringIO()
+        with redirect_stdout(stdout), redirect_stderr(StringIO()):
+            call_command(
+                "load_map_data", f"--file={self.csv_path}", "--chunk-size=2", *args
+            )
+        return stdout.getvalue().splitlines()[-1]
+
+    def test_load(self):
+        self.write_csv(
+            self.rows + [self.rows[0], {**self.rows[0], "parking_spot_id": ""}]
+        )
+        version = spatial.get_version()
+        self.assertEqual(self.load(), "5 records added, 0 updated, 2 skipped!")
+        self.assertNotEqual(spatial.get_version(), version)
+        spot = ParkingSpace.objects.get(parking_spot_id="3")
+        self.assertEqual(spot.parking_spot_name, f"{PARKING_SPOT_NAME} 3")
+        self.assertEqual((spot.lat, spot.lon), (float(LATITUDE), float(LONGITUDE)))
+
+        # * loading twice changes nothing
+        self.assertEqual(self.load(), "0 records added, 0 updated, 7 skipped!")
+        self.assertEqual(ParkingSpace.objects.count(), 5)
+
+    def test_load_snapshot(self):
+        self.rows.append({**self.rows[0], "parking_spot_id": "5", "latitude": ""})
+        self.write_csv(self.rows)
+        snapshot_path = os.path.join(self.directory.name, "snapshot")
+        save_snapshot(self.csv_path, snapshot_path)
+
+        # * the snapshot gives back the csv rows
+        self.assertEqual(
+            list(loader.read_rows(snapshot_path)), list(loader.read_rows(self.csv_path))
+        )
+        with redirect_stdout(StringIO()), redirect_stderr(StringIO()):
+            call_command("load_map_data", f"--file={snapshot_path}")
+        spot = ParkingSpace.objects.get(parking_spot_id="5")
+        self.assertEqual((spot.latitude, spot.lat), ("", None))
+        self.assertEqual(spot.content_hash, loader.content_hash(self.rows[5]))
+        self.assertEqual(ParkingSpace.objects.get(pk="0").lat, float(LATITUDE))
+
+    def test_update(self):
+        self.write_csv(self.rows[:3])
+        self.load()
+        ParkingSpace.objects.filter(parking_spot_id="0").update(occupancy_percent=50)
+
+        self.rows[0]["latitude"] = "40.8"
+        self.write_csv(self.rows)
+        self.assertEqual(
+            self.load("--update"), "2 records added, 3 updated, 0 skipped!"
+        )
+        spot = ParkingSpace.objects.get(parking_spot_id="0")
+        self.assertEqual((spot.latitude, spot.lat), ("40.8", 40.8))
+        # * columns that are not in the dataset are kept
+        self.assertEqual(spot.occupancy_percent, 50)
+
+    def test_sync(self):
+        self.write_csv(self.rows)
+        self.assertEqual(
+            self.load("--sync"), "5 records added, 0 updated, 0 unchanged, 0 retired!"
+        )
+        owner = User.objects.create_user(
+            username=USERNAME, email=EMAIL, password=PASSWORD
+        )
+        ParkingSpace.objects.filter(parking_spot_id="3").update(user=owner)
+        ParkingSpace.objects.create(
+            parking_spot_id="site", latitude=LATITUDE, user=owner
+        )
+
+        self.rows[0]["parking_spot_name"] = "Renamed"
+        self.write_csv(self.rows[:3] + [{**self.rows[0], "parking_spot_id": "5"}])
+        self.assertEqual(
+            self.load("--sync"), "1 records added, 1 updated, 2 unchanged, 1 retired!"
+        )
+        self.assertEqual(ParkingSpace.objects.get(pk="0").parking_spot_name, "Renamed")
+        # * spot 4 is retired, the claimed spot 3 and the site spot are kept
+        self.assertEqual(
+            set(ParkingSpace.objects.values_list("parking_spot_id", flat=True)),
+            {"0", "1", "2", "3", "5", "site"},
+        )
+        self.assertIsNotNone(ParkingSpace.all_objects.get(pk="4").retired_at)
+
+        # * nothing changed, nothing written
+        with self.assertNumQueries(4):
+            self.assertEqual(
+                loader.sync_spots(loader.read_rows(self.csv_path)),
+                loader.LoadCounts(0, 0, 4, 0),
+            )
+
+        # * spots coming back are restored
+        self.write_csv(self.rows[:3] + self.rows[4:])
+        self.assertEqual(
+            self.load("--sync"), "0 records added, 1 updated, 3 unchanged, 1 retired!"
+        )
+        self.assertIsNone(ParkingSpace.objects.get(pk="4").retired_at)
+
+    def test_sync_retires_legacy_spots(self):
+        # * spots loaded before content hashes were stored
+        for row in self.rows:
+            ParkingSpace.objects.create(**row)
+        self.write_csv(self.rows[:3])
+        self.assertEqual(
+            self.load("--sync"), "0 records added, 3 updated, 0 unchanged, 2 retired!"
+        )
+        self.assertEqual(
+            set(ParkingSpace.objects.values_list("parking_spot_id", flat=True)),
+            {"0", "1", "2"},
+        )
+
+
+class RetiredParkingSpaceAdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username=USERNAME, email=EMAIL, password=PASSWORD
+        )
+        self.retired_spot = ParkingSpace.objects.create(
+            parking_spot_id=PARKING_SPOT_ID, parking_spot_name=PARKING_SPOT_NAME
+        )
+        ParkingSpace.all_objects.filter(pk=PARKING_SPOT_ID).update(
+            retired_at=timezone.now()
+        )
+
+    def test_admin_shows_retired_spots(self):
+        self.client.login(username=USERNAME, password=PASSWORD)
+        response = self.client.get(reverse("admin:map_parkingspace_changelist"))
+        self.assertContains(response, PARKING_SPOT_NAME)
+
+        response = self.client.get(
+            reverse("admin:map_parkingspace_change", args=[PARKING_SPOT_ID])
+        )
+        self.assertEqual(response.status_code, 200)
+        # * still hidden from the site
+        self.assertFalse(ParkingSpace.objects.filter(pk=PARKING_SPOT_ID).exists())
+
+    def test_dumpdata_keeps_retired_spots(self):
+        stdout = StringIO()
+        call_command("dumpdata", "map.parkingspace", stdout=stdout)
+        self.assertIn(PARKING_SPOT_ID, stdout.getvalue())
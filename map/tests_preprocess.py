@@ -0,0 +1,158 @@
+import csv
+import importlib.util
+import os
+import tempfile
+from contextlib import redirect_stderr, redirect_stdout
+from datetime import datetime, timedelta
+from functools import lru_cache
+from io import StringIO
+from types import ModuleType
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+PARKING_SPOT_NAME = "Empire State Building"
+
+
+@lru_cache(maxsize=None)
+def load_preprocess_utils() -> ModuleType:
+    """preprocess_utils of the data/scripts folder, not a django app
+
+    Loaded from its file, so neither sys.path nor sys.modules is changed.
+    """
+    path = os.path.join(settings.BASE_DIR, "data", "scripts", "preprocess_utils.py")
+    spec = importlib.util.spec_from_file_location("preprocess_utils", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class PreprocessBackendParityTests(SimpleTestCase):
+    def setUp(self):
+        preprocess_utils = load_preprocess_utils()
+
+        self.utils = preprocess_utils
+        self.columns = [
+            {"name": "DCA License Number", "required": True, "type": str},
+            {"name": "Business Name", "required": True, "type": str},
+            {"name": "Detail", "required": False, "type": str},
+            {"name": "Latitude", "required": True, "type": float},
+            {
+                "name": "License Expiration Date",
+                "required": True,
+                "type": preprocess_utils._partialDatetime(),
+            },
+        ]
+        today = datetime.now().date()
+        # * strptime also accepts months that are not zero padded
+        dates = [
+            f"{date.month}/{date:%d/%Y}"
+            for date in [
+                today + timedelta(days=365),
+                today,
+                today - timedelta(days=1),
+                today + timedelta(days=365),
+            ]
+        ]
+        self.directory = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.directory.name, "parking_list.csv")
+        with open(self.csv_path, "w", newline="") as file:
+            writer = csv.DictWriter(file, [column["name"] for column in self.columns])
+            writer.writeheader()
+            for i in range(40):
+                writer.writerow(
+                    {
+                        "DCA License Number": f"{i:07d}-DCA",
+                        # * every fifth row misses a required column
+                        "Business Name": f"{PARKING_SPOT_NAME} {i}" if i % 5 else "",
+                        "Detail": "Vehicle Spaces: 10" if i % 2 else "",
+                        "Latitude": f"{40.7486538125 + i / 1e7}",
+                        "License Expiration Date": dates[i % 4],
+                    }
+                )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def process(self):
+        utils = self.utils
+        with redirect_stdout(StringIO()), redirect_stderr(StringIO()):
+            rows = list(
+                utils.iter_unexpired_rows(
+                    utils.iter_parsed_rows(
+                        utils.iter_valid_rows(
+                            utils.read_csv_rows(self.csv_path), self.columns
+                        ),
+                        self.columns,
+                    )
+                )
+            )
+            listed = utils.filter_license_expired_rows(
+                utils.parse_data(
+                    utils.filter_invalid_rows(
+                        list(utils.read_csv_rows(self.csv_path)), self.columns
+                    ),
+                    self.columns,
+                )
+            )
+            frame = utils.read_csv_frame(self.csv_path)
+            frame = utils.filter_invalid_frame(frame, self.columns)
+            frame = utils.parse_frame(frame, self.columns)
+            frame = utils.filter_license_expired_frame(frame)
+        return rows, listed, utils.frame_to_rows(frame)
+
+    def test_columnar_matches_row_wise(self):
+        rows, listed, columnar = self.process()
+        self.assertEqual(len(rows), 24)
+        # * the streamed and columnar paths both keep the file order
+        self.assertEqual(columnar, rows)
+        for row, columnar_row in zip(rows, columnar):
+            self.assertEqual(list(columnar_row), list(row))
+            self.assertEqual(
+                [type(value) for value in columnar_row.values()],
+                [type(value) for value in row.values()],
+            )
+        # * the in place list functions reorder the rows
+        self.assertCountEqual(listed, columnar)
+
+    def test_columnar_save_matches_row_wise(self):
+        rows, _, columnar = self.process()
+        saved = []
+        for content in [rows, columnar]:
+            path = os.path.join(self.directory.name, f"saved_{len(saved)}.csv")
+            with redirect_stdout(StringIO()):
+                self.assertTrue(self.utils.save_csv_file(path, content))
+            with open(path) as file:
+                saved.append(file.read())
+        self.assertEqual(saved[0], saved[1])
+
+    def test_failed_save_keeps_previous_file(self):
+        utils = self.utils
+        # * an invalid date in the 7th row, only raised while saving
+        with open(self.csv_path) as file:
+            lines = file.read().splitlines()
+        cells = lines[7].split(",")
+        cells[-1] = "13/45/2023"
+        lines[7] = ",".join(cells)
+        with open(self.csv_path, "w") as file:
+            file.write("\n".join(lines) + "\n")
+
+        result_path = os.path.join(self.directory.name, "result.csv")
+        tee_path = os.path.join(self.directory.name, "processed.csv")
+        with open(result_path, "w") as file:
+            file.write("previous result\n")
+        rows = utils.tee_csv_file(
+            tee_path,
+            utils.iter_parsed_rows(utils.read_csv_rows(self.csv_path), self.columns),
+        )
+        with redirect_stdout(StringIO()), self.assertRaises(ValueError):
+            utils.save_csv_file(result_path, rows)
+
+        with open(result_path) as file:
+            self.assertEqual(file.read(), "previous result\n")
+        self.assertEqual(
+            sorted(os.listdir(self.directory.name)), ["parking_list.csv", "result.csv"]
+        )
+
+        with redirect_stdout(StringIO()):
+            self.assertFalse(utils.save_csv_file(result_path, []))
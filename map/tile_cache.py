@@ -0,0 +1,167 @@
+"""tile keyed cache of serialized parking spots
+
+Spots are grouped in TILE_SIZE x TILE_SIZE degree tiles. A radius query is
+answered from the cached payloads of the tiles covering its bounding box,
+followed by an exact (vectorized) distance check, so nearby centers share
+the same cache entries.
+
+Every tile has a version number that is part of its payload cache keys.
+Changing a spot bumps the version of its tile, right away and again once
+the transaction commits, so a reader that loaded the tile before the
+commit can only write an entry nobody will read again. A global
+generation, bumped when any user verification changes, is part of every
+key as well since payloads nest the reporters' verification status.
+
+Versions live in the default cache, so invalidations only reach the
+workers sharing it. The cache is therefore off by default unless that
+cache is shared (settings.SHARED_CACHE). Missing tiles are read straight
+from the database with a bounding box query, never through the
+in-process spot index, which may lag behind writes of other workers.
+"""
+import math
+import time
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .spatial import haversine_miles
+
+TILE_SIZE = 0.01
+CACHE_KEY_PREFIX = "map:spot-tiles"
+GENERATION_CACHE_KEY = f"{CACHE_KEY_PREFIX}:generation"
+# * how far outside a tile the loader looks, so float rounding at tile
+# * edges never loses a spot, rows are assigned with tile_of afterwards
+EDGE_MARGIN = 1e-9
+
+Tile = Tuple[int, int]
+
+
+def tile_of(lat: float, lon: float) -> Tile:
+    return math.floor(lon / TILE_SIZE), math.floor(lat / TILE_SIZE)
+
+
+def tiles_in_bbox(south: float, west: float, north: float, east: float) -> List[Tile]:
+    (min_x, min_y), (max_x, max_y) = tile_of(south, west), tile_of(north, east)
+    return [(x, y) for x in range(min_x, max_x + 1) for y in range(min_y, max_y + 1)]
+
+
+def tiles_bbox(tiles: List[Tile]) -> Tuple[float, float, float, float]:
+    """(south, west, north, east) of the box containing every tile"""
+    xs = [x for x, _ in tiles]
+    ys = [y for _, y in tiles]
+    return (
+        min(ys) * TILE_SIZE - EDGE_MARGIN,
+        min(xs) * TILE_SIZE - EDGE_MARGIN,
+        (max(ys) + 1) * TILE_SIZE + EDGE_MARGIN,
+        (max(xs) + 1) * TILE_SIZE + EDGE_MARGIN,
+    )
+
+
+def version_key(tile: Tile) -> str:
+    return f"{CACHE_KEY_PREFIX}:version:{tile[0]}:{tile[1]}"
+
+
+def payload_key(variant: str, tile: Tile, generation: int, version: int) -> str:
+    return f"{CACHE_KEY_PREFIX}:{variant}:{generation}:{tile[0]}:{tile[1]}:{version}"
+
+
+def _new_version() -> int:
+    # * a version key evicted from the cache must not restart from a value
+    # * some still cached payload was built with
+    return time.time_ns()
+
+
+def _bump(key: str) -> None:
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), timeout=None)
+
+
+def _bump_now_and_on_commit(key: str) -> None:
+    _bump(key)
+    transaction.on_commit(lambda: _bump(key))
+
+
+def invalidate_spot(lat, lon) -> None:
+    """drop the cached payloads of the tile holding (lat, lon)"""
+    if lat is None or lon is None:
+        return
+    _bump_now_and_on_commit(version_key(tile_of(lat, lon)))
+
+
+def invalidate_all() -> None:
+    _bump_now_and_on_commit(GENERATION_CACHE_KEY)
+
+
+def get_tiles(
+    variant: str,
+    tiles: List[Tile],
+    load: Callable[[List[Tile]], Dict[Tile, List[Tuple[float, float, dict]]]],
+) -> Dict[Tile, dict]:
+    """cached payloads of the tiles, loading the missing ones
+
+    Args:
+        variant (str): payload flavor, part of the cache key
+        tiles (List[Tile]): tiles to get
+        load (Callable): returns the (lat, lon, serialized spot) of every
+        spot of each missing tile, the coordinates being the numeric
+        columns so that the text ones are never parsed again
+
+    Returns:
+        Dict[Tile, dict]: {"lats": [...], "lons": [...], "spots": [...]}
+        of each tile
+    """
+    version_keys = {version_key(tile): tile for tile in tiles}
+    versions = cache.get_many([GENERATION_CACHE_KEY, *version_keys])
+    unversioned = [
+        key for key in [GENERATION_CACHE_KEY, *version_keys] if key not in versions
+    ]
+    if unversioned:
+        for key in unversioned:
+            cache.add(key, _new_version(), timeout=None)
+        versions.update(cache.get_many(unversioned))
+        for key in unversioned:
+            versions.setdefault(key, _new_version())
+    generation = versions[GENERATION_CACHE_KEY]
+    keys = {
+        payload_key(variant, tile, generation, versions[key]): tile
+        for key, tile in version_keys.items()
+    }
+
+    payloads = {keys[key]: payload for key, payload in cache.get_many(keys).items()}
+    missing = [tile for tile in tiles if tile not in payloads]
+    if missing:
+        loaded = load(missing)
+        new_payloads = {}
+        for key, tile in keys.items():
+            if tile in payloads:
+                continue
+            spots = loaded.get(tile, [])
+            payloads[tile] = new_payloads[key] = {
+                "lats": [lat for lat, _, _ in spots],
+                "lons": [lon for _, lon, _ in spots],
+                "spots": [spot for _, _, spot in spots],
+            }
+        cache.set_many(new_payloads, timeout=settings.PARKING_SPOT_TILE_CACHE_TIMEOUT)
+    return payloads
+
+
+def spots_within(
+    payloads: Dict[Tile, dict], center: Tuple[float, float], radius_miles: float
+) -> List[dict]:
+    """serialized spots of the payloads strictly within radius_miles of center"""
+    spots, lats, lons = [], [], []
+    for payload in payloads.values():
+        spots.extend(payload["spots"])
+        lats.extend(payload["lats"])
+        lons.extend(payload["lons"])
+    if not spots:
+        return []
+    distances = haversine_miles(
+        center, np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64)
+    )
+    return [spot for spot, is_near in zip(spots, distances < radius_miles) if is_near]
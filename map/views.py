@@ -1,15 +1,16 @@
 from typing import Optional
 from django.views import View
 from django.conf import settings
-from django.db.models import Max
 from better_profanity import profanity
 from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.shortcuts import get_object_or_404, render, redirect
 
 
-from users.models import User, UserVerification, UserWatchedParkingSpace
-from .models import OccupancyHistory, ParkingSpace
+from users import verifications
+from users.models import User, UserWatchedParkingSpace
+from . import peak_times, spot_ids
+from .models import ParkingSpace
 from .forms import CreatePostForm, CreateParkingSpaceForm
 
 
@@ -32,11 +33,7 @@ class MapView(View):
         Returns:
             HttpResponse: rendered map view response
         """
-        user_verification = None
-        if request.user.is_authenticated:
-            user_verification = UserVerification.objects.filter(
-                username=request.user
-            ).first()
+        user_verification = verifications.for_request(request)
 
         context = {
             "GOOGLE_MAP_ID": settings.GOOGLE_MAP_ID,
@@ -62,7 +59,7 @@ class PostView(View, LoginRequiredMixin):
         Returns:
             HttpResponse: rendered post view
         """
-        spot = get_object_or_404(ParkingSpace, parking_spot_id=parking_spot_id)
+        spot = get_object_or_404(ParkingSpace.objects, parking_spot_id=parking_spot_id)
         context = {
             "spot": spot,
             "form": self.form_class(None),
@@ -83,7 +80,7 @@ class PostView(View, LoginRequiredMixin):
         """
         map_template_name = "map/parking.html"
         author = get_object_or_404(User, username=request.user.username)
-        spot = get_object_or_404(ParkingSpace, parking_spot_id=parking_spot_id)
+        spot = get_object_or_404(ParkingSpace.objects, parking_spot_id=parking_spot_id)
         form = self.form_class(request.POST)
         if form.is_valid():
             profanity.add_censor_words(custom_badwords)
@@ -94,11 +91,7 @@ class PostView(View, LoginRequiredMixin):
             new_post.post = profanity.censor(form.cleaned_data["post"])
             new_post.save()
 
-            user_verification = None
-            if request.user.is_authenticated:
-                user_verification = UserVerification.objects.filter(
-                    username=request.user
-                ).first()
+            user_verification = verifications.for_request(request)
 
             map_context = {
                 "GOOGLE_MAPS_API_KEY": settings.GOOGLE_MAPS_API_KEY,
@@ -138,9 +131,7 @@ class ParkingSpaceView(View, LoginRequiredMixin):
     def __render_page_with_optional_error(
         self, request: HttpRequest, error: Optional[str] = None
     ) -> HttpResponse:
-        user_verification = UserVerification.objects.filter(
-            username=request.user
-        ).first()
+        user_verification = verifications.for_request(request)
         context = {
             "error": error,
             "form": self.form_class(None),
@@ -149,22 +140,6 @@ class ParkingSpaceView(View, LoginRequiredMixin):
         }
         return render(request, self.template_name, context)
 
-    def __get_next_parkingspace_id(self):
-        """helper method to get next spot ID
-
-        Returns:
-            _type_: _description_
-        """
-        max_parkingspace_id = self.model.objects.aggregate(Max("parking_spot_id"))[
-            "parking_spot_id__max"
-        ]
-        if max_parkingspace_id is None:
-            return "1"
-        max_parkingspace_id = int(max_parkingspace_id)
-
-        # Increment the max_parkingspace_id to get the next parkingspace_id
-        return str(max_parkingspace_id + 1)
-
     def post(self, request: HttpRequest) -> HttpResponse:
         """handle spot creation post req
 
@@ -191,17 +166,12 @@ class ParkingSpaceView(View, LoginRequiredMixin):
         map_template_name = "map/parking.html"
         if form.is_valid():
             new_spot = form.save(commit=False)
-            new_spot.parking_spot_id = self.__get_next_parkingspace_id()
             new_spot.longitude = lon
             new_spot.latitude = lat
             new_spot.user = user
-            new_spot.save()
+            spot_ids.create_spot(new_spot)
 
-            user_verification = None
-            if request.user.is_authenticated:
-                user_verification = UserVerification.objects.filter(
-                    username=request.user
-                ).first()
+            user_verification = verifications.for_request(request)
             map_context = {
                 "GOOGLE_MAPS_API_KEY": settings.GOOGLE_MAPS_API_KEY,
                 "GOOGLE_MAP_ID": settings.GOOGLE_MAP_ID,
@@ -247,23 +217,7 @@ class PeakTimeView(View):
         Returns:
             HttpResponse: returns the peak time of a spot
         """
-        history = OccupancyHistory.objects.filter(parking_space=parking_spot_id)
-        times = {}
-
-        if history:
-            for entry in history:
-                date = entry.updated_at
-                date = date.strptime(str(date), "%Y-%m-%d %H:%M:%S.%f")
-
-                hour = date.strftime("%H")
-
-                if hour in times:
-                    times[hour] += 1
-                else:
-                    times[hour] = 1
-
-            return JsonResponse(
-                {"peak_time": str(max(times, key=times.get) + " o'clock")}
-            )
-        else:
+        hour = peak_times.peak_hour(parking_spot_id)
+        if hour is None:
             return JsonResponse({"peak_time": "Not enough past data."})
+        return JsonResponse({"peak_time": f"{hour:02d} o'clock"})
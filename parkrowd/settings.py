@@ -109,6 +109,60 @@ private_ip = get_linux_ec2_private_ip()
 if private_ip:
     ALLOWED_HOSTS += [private_ip]
 
+# * Cache, local memory by default. Point CACHE_BACKEND / CACHE_LOCATION to a
+# * shared cache (e.g. django.core.cache.backends.redis.RedisCache) so that
+# * invalidations and the spot index version reach every worker
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", "parkrowd"),
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+}
+# * Whether every worker sees the same default cache
+SHARED_CACHE = CACHES["default"]["BACKEND"] not in [
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+]
+
+# * Nearby parking spot search engine used by /api/spots/
+# * "index" : in-process numpy index (map/spatial.py), rebuilt when spots change
+# * "database" : bounding box lookup on the (lat, lon) index, exact check in python
+PARKING_SPOT_SEARCH_ENGINE = os.getenv("PARKING_SPOT_SEARCH_ENGINE", "index")
+# * Max seconds an in-process spot index is trusted before being rebuilt,
+# * bounds staleness when workers do not share a cache
+PARKING_SPOT_INDEX_MAX_AGE = int(os.getenv("PARKING_SPOT_INDEX_MAX_AGE", 300))
+# * Seconds a tile of /api/spots/clusters/ stays cached
+PARKING_SPOT_CLUSTER_CACHE_TIMEOUT = int(
+    os.getenv("PARKING_SPOT_CLUSTER_CACHE_TIMEOUT", 60)
+)
+# * Seconds a tile of serialized spots for /api/spots/ stays cached,
+# * 0 disables the tile cache. Entries are invalidated through the default
+# * cache when a spot changes, so the tile cache is off unless that cache is
+# * shared: other workers would serve stale occupancy otherwise, see
+# * map/tile_cache.py
+PARKING_SPOT_TILE_CACHE_TIMEOUT = int(
+    os.getenv("PARKING_SPOT_TILE_CACHE_TIMEOUT", 300 if SHARED_CACHE else 0)
+)
+# * Peak time engine used by /map/peak-time/
+# * "counts" : per weekday / hour report counts kept up to date (map/peak_times.py)
+# * "history" : GROUP BY hour over the spot's history (on its (spot, time) index)
+# * and rollups
+PEAK_TIME_BACKEND = os.getenv("PEAK_TIME_BACKEND", "counts")
+# * Days of raw occupancy history kept by the rollup_occupancy_history command,
+# * older reports are folded into OCCUPANCY_ROLLUP_BUCKET_MINUTES (15 or 60)
+# * minute aggregates, see map/rollups.py
+OCCUPANCY_HISTORY_RETENTION_DAYS = int(
+    os.getenv("OCCUPANCY_HISTORY_RETENTION_DAYS", 90)
+)
+OCCUPANCY_ROLLUP_BUCKET_MINUTES = int(os.getenv("OCCUPANCY_ROLLUP_BUCKET_MINUTES", 60))
+
+# * Seconds the latest verification of a user stays cached, entries are
+# * dropped when one of the user's verifications changes (users/verifications.py)
+USER_VERIFICATION_CACHE_TIMEOUT = int(os.getenv("USER_VERIFICATION_CACHE_TIMEOUT", 300))
+
 # * Custom User Model for Authorization
 AUTH_USER_MODEL = "users.User"
 
@@ -148,6 +202,12 @@ EMAIL_BACKEND = (
     if os.getenv("PROD") == "false"
     else "django.core.mail.backends.smtp.EmailBackend"
 )
+# * How queued watch notifications get sent (see api/notifications.py)
+# * "thread" : background thread of the web process, after each update,
+# * failures are retried with a backoff up to MAX_ATTEMPTS while the process
+# * lives, run the command below now and then to pick up what is left
+# * "worker" : only by `python manage.py send_watch_notifications [--loop]`
+WATCH_NOTIFICATION_DISPATCH = os.getenv("WATCH_NOTIFICATION_DISPATCH", "thread")
 
 # * Application definition
 INSTALLED_APPS = [
@@ -5,6 +5,6 @@ class UsersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "users"
 
-    # Gio: I thought this was necessary, but it seems it is not
-    # def ready(self):
-    # import users.signals
+    def ready(self):
+        # * connects the verification cache invalidation
+        from . import verifications  # noqa: F401
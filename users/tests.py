@@ -2,7 +2,8 @@ import dateutil.parser
 from django.core import mail
 from datetime import timedelta
 from django.urls import reverse
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
 from django.utils import timezone
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
@@ -11,6 +12,7 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth.tokens import default_token_generator
 
 from users.models import User
+from . import verifications
 from .models import (
     UserVerification,
     Post,
@@ -146,6 +148,51 @@ class UserVerificationViewTest(TestCase):
         )
 
 
+class LatestVerificationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.test_user = User.objects.create_user(
+            username=USERNAME, email=EMAIL, password=PASSWORD
+        )
+
+    def test_cached_across_requests(self):
+        with self.assertNumQueries(1):
+            self.assertIsNone(verifications.latest_verification(self.test_user))
+        # * users without verification are cached too
+        with self.assertNumQueries(0):
+            self.assertIsNone(verifications.latest_verification(self.test_user))
+
+        verification = UserVerification.objects.create(
+            username=self.test_user, business_name="Test Business"
+        )
+        self.assertEqual(
+            verifications.latest_verification(self.test_user).status, "submitted"
+        )
+        with self.assertNumQueries(0):
+            verifications.latest_verification(self.test_user)
+
+        # * saving a verification drops the cached one
+        verification.status = "verified"
+        verification.save()
+        self.assertEqual(
+            verifications.latest_verification(self.test_user).status, "verified"
+        )
+
+        verification.delete()
+        self.assertIsNone(verifications.latest_verification(self.test_user))
+
+    def test_once_per_request(self):
+        UserVerification.objects.create(username=self.test_user, status="verified")
+        request = RequestFactory().get("/")
+        request.user = self.test_user
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(verifications.for_request(request).status, "verified")
+            # * memoized on the request, even without the shared cache
+            cache.clear()
+            self.assertEqual(verifications.for_request(request).status, "verified")
+
+
 class RegisterTests(TestCase):
     def test_registration_view(self):
         """checks if register page returns a 200 Status Code
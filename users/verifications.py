@@ -0,0 +1,79 @@
+"""cached lookup of the latest verification of a user
+
+Pages check the status of the visitor's latest UserVerification on every
+render. It is read at most once per request (for_request memoizes it on
+the request) and kept in the default cache between requests, keyed by
+user. Saving or deleting a verification drops the entry of its user,
+right away and again once the transaction commits, so a reader that
+cached the old value before the commit does not keep it.
+"""
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpRequest
+
+from .models import User, UserVerification
+
+CACHE_KEY_PREFIX = "users:latest-verification"
+# * cached in place of None, so users without verification are cached too
+NO_VERIFICATION = "none"
+_MISSING = object()
+
+
+def cache_key(user_id: int) -> str:
+    return f"{CACHE_KEY_PREFIX}:{user_id}"
+
+
+def latest_verification(user: User) -> Optional[UserVerification]:
+    """latest submitted verification of a user, from the cache when possible
+
+    Args:
+        user (User): user to look up
+
+    Returns:
+        Optional[UserVerification]: the verification, None when the user
+        never submitted one
+    """
+    key = cache_key(user.pk)
+    verification = cache.get(key, _MISSING)
+    if verification is _MISSING:
+        verification = UserVerification.objects.filter(username=user).first()
+        cache.set(
+            key,
+            verification or NO_VERIFICATION,
+            timeout=settings.USER_VERIFICATION_CACHE_TIMEOUT,
+        )
+    return None if verification == NO_VERIFICATION else verification
+
+
+def for_request(request: HttpRequest) -> Optional[UserVerification]:
+    """latest verification of the logged-in user, looked up once per request
+
+    Args:
+        request (HttpRequest): http request object
+
+    Returns:
+        Optional[UserVerification]: the verification, None for anonymous
+        users and users who never submitted one
+    """
+    if not hasattr(request, "_latest_verification"):
+        request._latest_verification = (
+            latest_verification(request.user) if request.user.is_authenticated else None
+        )
+    return request._latest_verification
+
+
+def invalidate(user_id: int) -> None:
+    key = cache_key(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+@receiver(post_save, sender=UserVerification)
+@receiver(post_delete, sender=UserVerification)
+def user_verification_changed(sender, instance, **kwargs):
+    invalidate(instance.username_id)
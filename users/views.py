@@ -12,6 +12,7 @@ from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
 from django.contrib.auth.views import INTERNAL_RESET_SESSION_TOKEN
 
+from . import verifications
 from .models import User, Post, UserVerification, ParkingSpace
 from .backends import EmailOrUsernameAuthenticationBackend
 from .forms import (
@@ -348,7 +349,7 @@ class UserProfileView(View):
         user = get_object_or_404(User, username=username)
         user_posts = Post.objects.filter(author=user)
         user_spots = ParkingSpace.objects.filter(user=user)
-        user_verification = UserVerification.objects.filter(username=user).first()
+        user_verification = verifications.latest_verification(user)
 
         # * conditionally render the delete button
         # * only if the user is logged-in and viewing his/her own profile